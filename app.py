@@ -2,151 +2,295 @@ import os
 import csv
 import io
 from datetime import datetime, date
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response
-from flask_sqlalchemy import SQLAlchemy
+from urllib.parse import urlencode, urlsplit, parse_qsl
+import click
+from flask.cli import with_appcontext
+from flask import Flask, Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response, abort, stream_with_context
 from werkzeug.security import check_password_hash, generate_password_hash
-from models import db, User, Organization, Issue, Comment
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///db.sqlite3'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
+from sqlalchemy import case, func, insert, inspect, select, text, update
+from models import db, User, Organization, Issue, Comment, create_issue_indexes
+import columnar
+from assets import init_assets
+from templating import init_templates
+from timing import init_server_timing
+from write_queue import init_write_queue, run_write
+from shared_cache import init_shared_cache, cached
+from sla import init_sla, sla_summary
+from sharding import (init_shards, use_shard, use_issue_shard, add_issue, move_issue, forget_issue, drop_shard,
+                      read_issues, shard_connections, sharding_enabled, reorder_issues as reorder_issue_rows,
+                      move_primary_issues_to_shards, use_unique_organization_ids)
+from importer import import_issues, CSVImportError
+from duplicates import likely_duplicate, shingles, index_issues, reindex_issue, forget_buckets, rebuild_index
+from projections import issue_rows
+from filters import current_filters, listing_statement, listing_order
+from routing import init_replica, read_only, replica_engine, snapshot_sqlite_replica
+from backends import normalize_database_url, configure_sqlite, is_postgresql, copy_export_csv
 
 # Admin password from environment
 ADMIN_PASSWORD = os.environ.get('APP_PASSWORD', 'admin123')
 
+bp = Blueprint('main', __name__)
+
+# Import problems listed on the page; the rest are only counted
+MAX_IMPORT_ERRORS_SHOWN = 200
+
+def create_app(config=None):
+    """Application factory.
+
+    Only builds the app object and warms the template cache - no database
+    work happens here, so every worker boots instantly. Schema creation and
+    sample data are one-shot steps run via ``flask --app app init-db`` and
+    ``flask --app app seed``.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
+    # SQLite by default; point DATABASE_URL at PostgreSQL to scale beyond one writer
+    app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(
+        os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3'))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Optional read replica for listing/export routes, e.g. a snapshotted SQLite copy
+    app.config['REPLICA_DATABASE_URL'] = os.environ.get('REPLICA_DATABASE_URL')
+    # How long a browser session keeps reading from the primary after it writes
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 60))
+    # Per-connection SQLite settings, e.g. journal_mode=wal,busy_timeout=5000
+    app.config['SQLITE_PRAGMAS'] = os.environ.get('SQLITE_PRAGMAS', '')
+    # Server-Timing response headers with SQL and commit time, for load testing
+    app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING') == '1'
+    # Commit comments, edits and restores in batches from one writer thread
+    app.config['WRITE_COALESCING'] = os.environ.get('WRITE_COALESCING') == '1'
+    app.config['WRITE_BATCH_WINDOW_MS'] = float(os.environ.get('WRITE_BATCH_WINDOW_MS', 5))
+    app.config['WRITE_BATCH_SIZE'] = int(os.environ.get('WRITE_BATCH_SIZE', 100))
+    # Optional directory of per-organisation SQLite shards for issues and comments
+    app.config['SHARDS_DIR'] = os.environ.get('SHARDS_DIR')
+    # Optional SQLite file caching board snapshots and facets across worker processes
+    app.config['SHARED_CACHE_PATH'] = os.environ.get('SHARED_CACHE_PATH')
+    # How often the ASGI server's /changes feed polls for changed issues (asgi.py)
+    app.config['CHANGE_FEED_SECONDS'] = float(os.environ.get('CHANGE_FEED_SECONDS', 2))
+    # Most seconds between rescans of the overdue issues behind the board's SLA tiles
+    app.config['SLA_SCAN_SECONDS'] = float(os.environ.get('SLA_SCAN_SECONDS', 60))
+    if config:
+        app.config.update(config)
+
+    if app.config['REPLICA_DATABASE_URL']:
+        app.config['REPLICA_DATABASE_URL'] = normalize_database_url(app.config['REPLICA_DATABASE_URL'])
+
+    db.init_app(app)
+    configure_sqlite(app)
+    init_replica(app)
+    init_assets(app)
+    app.register_blueprint(bp)
+    init_templates(app)
+    init_server_timing(app)
+    init_write_queue(app)
+    init_shards(app)
+    init_shared_cache(app)
+    init_sla(app)
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(snapshot_replica_command)
+    app.cli.add_command(dedup_command)
+
+    return app
+
 def require_auth(f):
     from functools import wraps
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not session.get('authenticated'):
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/login', methods=['GET', 'POST'])
+def is_htmx():
+    """True for requests made by HTMX, which get HTML fragments instead of JSON"""
+    return request.headers.get('HX-Request') == 'true'
+
+def request_data():
+    """JSON body from API clients, form fields from HTMX"""
+    return request.get_json(silent=True) or request.form
+
+class StaleIssueError(Exception):
+    """The issue was changed since the client loaded the version it sent"""
+
+@bp.errorhandler(StaleIssueError)
+def stale_issue(e):
+    return jsonify({
+        'success': False,
+        'error': 'This issue was changed by someone else. Reopen it to see their changes.'
+    }), 409
+
+class InvalidVersionError(Exception):
+    """The client sent a version that isn't a whole number"""
+
+@bp.errorhandler(InvalidVersionError)
+def invalid_version(e):
+    return jsonify({'success': False, 'error': 'Version must be a whole number'}), 400
+
+def requested_version(data):
+    """The version the client loaded, as an int, or None if it didn't send one"""
+    version = data.get('version')
+    if version is None or version == '':
+        return None
+    # JSON clients could send a float, bool, list or object, none of which is a version
+    if isinstance(version, bool) or not isinstance(version, (int, str)):
+        raise InvalidVersionError()
+    try:
+        return int(version)
+    except ValueError:
+        raise InvalidVersionError()
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         password = request.form.get('password')
         if password == ADMIN_PASSWORD:
             session['authenticated'] = True
-            return redirect(url_for('index'))
+            return redirect(url_for('main.index'))
         else:
             flash('Invalid password', 'error')
     return render_template('login.html')
 
-@app.route('/logout', methods=['POST'])
+@bp.route('/logout', methods=['POST'])
 def logout():
     session.pop('authenticated', None)
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/')
+@bp.route('/')
 @require_auth
+@read_only
 def index():
-    # Get filter parameters
-    status_filter = request.args.get('status', '')
-    owner_filter = request.args.get('owner', '')
-    organization_filter = request.args.get('organization', '')
-    search_query = request.args.get('q', '')
-
-    # Build query - exclude archived issues by default
-    query = Issue.query.filter(Issue.archived == False)
-
-    if status_filter:
-        query = query.filter(Issue.status == status_filter)
-    if owner_filter:
-        query = query.filter(Issue.owner == owner_filter)
-    if organization_filter:
-        query = query.filter(Issue.organization_id == organization_filter)
-    if search_query:
-        query = query.filter(
-            (Issue.title.contains(search_query)) |
-            (Issue.description.contains(search_query)) |
-            (Issue.reporter.contains(search_query))
-        )
-
-    # Sort by display_order first (for manual ordering), then by date_reported (oldest first = most important)
-    query = query.order_by(Issue.display_order.asc(), Issue.date_reported.asc())
-
-    issues = query.all()
+    filters = current_filters(request.args)
+    # Exclude archived issues; manual order first, then oldest first
+    issues = cached(_listing_key('board', filters), lambda: issue_rows(_read_listing('board', filters)))
 
     # Get filter options
-    statuses = db.session.query(Issue.status).distinct().all()
-    owners = db.session.query(Issue.owner).filter(Issue.owner.isnot(None)).distinct().all()
-    organizations = Organization.query.all()
+    statuses, owners, organizations = cached('board-facets', lambda: _facets(archived=False))
 
     return render_template('index.html', 
                          issues=issues,
-                         statuses=[s[0] for s in statuses],
-                         owners=[o[0] for o in owners],
+                         statuses=statuses,
+                         owners=owners,
                          organizations=organizations,
-                         current_filters={
-                             'status': status_filter,
-                             'owner': owner_filter,
-                             'organization': organization_filter,
-                             'q': search_query
-                         },
+                         current_filters=filters,
+                         sla=sla_summary(),
                          date=date)
 
-@app.route('/issues', methods=['POST'])
+@bp.route('/issues', methods=['POST'])
 @require_auth
 def create_issue():
-    data = request.get_json()
+    data = request_data()
     
     issue = Issue(
         title=data['title'],
         description=data.get('description', ''),
         reporter=data['reporter'],
         owner=data.get('owner'),
-        organization_id=data.get('organization_id'),
+        organization_id=data.get('organization_id') or None,
         status=data.get('status', 'Open'),
         importance=data.get('importance', 'Medium'),
         date_reported=datetime.strptime(data['date_reported'], '%Y-%m-%d').date() if data.get('date_reported') else date.today(),
         target_date=datetime.strptime(data['target_date'], '%Y-%m-%d').date() if data.get('target_date') else None
     )
     
-    db.session.add(issue)
+    if not data.get('allow_duplicate'):
+        duplicate = likely_duplicate(issue.title, issue.description)
+        if duplicate is not None:
+            return jsonify({'success': False, 'duplicate_of': duplicate.id,
+                            'error': f'This looks like a duplicate of issue #{duplicate.id}: {duplicate.title}'}), 409
+    
+    add_issue(issue)
+    db.session.flush()
+    index_issues([(issue.id, issue.title, issue.description)])
     db.session.commit()
     
+    if is_htmx():
+        return _listing_fragment(issue.id)
     return jsonify({'success': True, 'id': issue.id})
 
-@app.route('/issues/<int:issue_id>', methods=['POST'])
+@bp.route('/issues/<int:issue_id>', methods=['POST'])
 @require_auth
 def update_issue(issue_id):
-    issue = Issue.query.get_or_404(issue_id)
-    data = request.get_json()
-    
-    # Update fields
-    issue.title = data.get('title', issue.title)
-    issue.description = data.get('description', issue.description)
-    issue.reporter = data.get('reporter', issue.reporter)
-    issue.owner = data.get('owner', issue.owner)
-    issue.organization_id = data.get('organization_id', issue.organization_id)
-    issue.status = data.get('status', issue.status)
-    issue.importance = data.get('importance', issue.importance)
-    issue.target_date = datetime.strptime(data['target_date'], '%Y-%m-%d').date() if data.get('target_date') else None
+    data = request_data()
+    version = run_write(_update_issue, issue_id, data, requested_version(data))
+    if is_htmx():
+        return _listing_fragment(issue_id)
+    return jsonify({'success': True, 'version': version})
+
+def _update_issue(issue_id, data, version=None):
+    """Apply the fields in ``data`` as one conditional UPDATE and return the new version.
+
+    Given the ``version`` the client loaded, the update only
+    matches while the issue is still at that version, so a concurrent edit
+    raises StaleIssueError instead of being silently overwritten.
+    """
+    values = {name: data[name] for name in ('title', 'description', 'reporter', 'owner', 'status', 'importance')
+              if name in data}
+    if 'organization_id' in data:
+        values['organization_id'] = data['organization_id'] or None
+    values['target_date'] = datetime.strptime(data['target_date'], '%Y-%m-%d').date() if data.get('target_date') else None
     
     # Auto-archive when status is set to "Completed"
-    if issue.status == 'Completed':
-        issue.archived = True
-    
-    issue.updated_at = datetime.utcnow()
+    if 'status' in values:
+        if values['status'] == 'Completed':
+            values['archived'] = True
+    else:
+        values['archived'] = case((Issue.status == 'Completed', True), else_=Issue.archived)
     
-    db.session.commit()
-    return jsonify({'success': True})
-
-@app.route('/issues/<int:issue_id>/edit')
+    use_issue_shard(issue_id)
+    if 'organization_id' in values:
+        # With sharding, changing organisation moves the issue to another shard
+        move_issue(issue_id, values['organization_id'])
+    # The edit form always sends the text; only rewrite the duplicate index when its word pairs changed
+    reindex = None
+    if 'title' in values or 'description' in values:
+        old = db.session.execute(select(Issue.title, Issue.description).where(Issue.id == issue_id)).first()
+        if old is not None:
+            title, description = values.get('title', old.title), values.get('description', old.description)
+            if shingles(title, description) != shingles(old.title, old.description):
+                reindex = (title, description)
+    version = _conditional_update(issue_id, version, values)
+    if version is None:
+        _archived_or_404(issue_id)
+        raise StaleIssueError()
+    if reindex is not None:
+        reindex_issue(issue_id, *reindex)
+    return version
+
+def _conditional_update(issue_id, version, values, *conditions):
+    """UPDATE the issue if ``conditions`` hold and it is at ``version`` (when given).
+
+    Bumps the version and returns the new one, or None if no row matched.
+    """
+    conditions = [Issue.id == issue_id, *conditions]
+    if version is not None:
+        conditions.append(Issue.version == version)
+    stmt = (update(Issue).where(*conditions)
+            .values(**values, version=Issue.version + 1, updated_at=datetime.utcnow())
+            .returning(Issue.version))
+    return db.session.execute(stmt).scalar()
+
+def _archived_or_404(issue_id):
+    """The issue's archived flag, or 404 if it doesn't exist"""
+    archived = db.session.scalar(select(Issue.archived).where(Issue.id == issue_id))
+    if archived is None:
+        abort(404)
+    return archived
+
+# Not @read_only: the form's version is the precondition for saving it, so it
+# must come from the primary, not a replica that may still be behind
+@bp.route('/issues/<int:issue_id>/edit')
 @require_auth
 def edit_issue_form(issue_id):
+    use_issue_shard(issue_id)
     issue = Issue.query.get_or_404(issue_id)
     organizations = Organization.query.all()
     return render_template('edit_form.html', issue=issue, organizations=organizations)
 
-@app.route('/issues/<int:issue_id>', methods=['DELETE'])
+@bp.route('/issues/<int:issue_id>', methods=['DELETE'])
 @require_auth
 def delete_issue(issue_id):
+    use_issue_shard(issue_id)
     issue = Issue.query.get_or_404(issue_id)
     
     # Delete associated comments first
@@ -154,32 +298,36 @@ def delete_issue(issue_id):
     
     # Delete the issue
     db.session.delete(issue)
+    forget_issue(issue_id)
+    forget_buckets([issue_id])
     db.session.commit()
     
+    if is_htmx():
+        return _listing_fragment()
     return jsonify({'success': True})
 
-@app.route('/issues/<int:issue_id>/comment', methods=['POST'])
+@bp.route('/issues/<int:issue_id>/comment', methods=['POST'])
 @require_auth
 def add_comment(issue_id):
-    issue = Issue.query.get_or_404(issue_id)
-    data = request.get_json()
+    run_write(_add_comment, issue_id, request.get_json())
+    return jsonify({'success': True})
+
+def _add_comment(issue_id, data):
+    use_issue_shard(issue_id)
+    Issue.query.get_or_404(issue_id)
     
-    comment = Comment(
+    # A plain INSERT: comment ids are only unique per shard, so keep them out of the identity map
+    db.session.execute(insert(Comment).values(
         issue_id=issue_id,
         author=data['author'],
         body=data['body']
-    )
-    
-    db.session.add(comment)
-    db.session.commit()
-    
-    return jsonify({'success': True})
+    ))
 
 # Add organization management routes
-@app.route('/organizations', methods=['POST'])
+@bp.route('/organizations', methods=['POST'])
 @require_auth
 def create_organization():
-    data = request.get_json()
+    data = request_data()
     
     # Check if organization already exists
     existing = Organization.query.filter_by(name=data['name']).first()
@@ -190,18 +338,21 @@ def create_organization():
         organization = Organization(name=data['name'])
         db.session.add(organization)
         db.session.commit()
+        if is_htmx():
+            return _organization_fragment(organization)
         return jsonify({'success': True, 'id': organization.id, 'name': organization.name})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': 'Organisation name already exists'}), 400
 
-@app.route('/organizations/<int:org_id>', methods=['DELETE'])
+@bp.route('/organizations/<int:org_id>', methods=['DELETE'])
 @require_auth
 def delete_organization(org_id):
     organization = Organization.query.get_or_404(org_id)
     
     # Check if organization is used by any issues
-    issue_count = Issue.query.filter_by(organization_id=org_id).count()
+    issue_count = sum(count for count, in read_issues(
+        select(func.count()).select_from(Issue).where(Issue.organization_id == org_id), organization=org_id))
     if issue_count > 0:
         return jsonify({
             'success': False, 
@@ -209,222 +360,279 @@ def delete_organization(org_id):
             'issue_count': issue_count
         }), 400
     
+    # Deleting loads the organisation's (no) issues, from its shard when sharded
+    use_shard(org_id)
     db.session.delete(organization)
     db.session.commit()
+    drop_shard(org_id)
+    if is_htmx():
+        # Swapped over the organisation's row, removing it
+        return ''
     return jsonify({'success': True})
 
-@app.route('/manage-organisations')
+@bp.route('/manage-organisations')
 @require_auth
+@read_only
 def manage_organisations():
     organizations = Organization.query.all()
-    # Get issue counts for each organization
+    # Get issue counts for each organization, in one grouped query
+    issue_counts = dict(read_issues(
+        select(Issue.organization_id, func.count()).group_by(Issue.organization_id)))
     org_data = []
     for org in organizations:
-        issue_count = Issue.query.filter_by(organization_id=org.id).count()
         org_data.append({
             'id': org.id,
             'name': org.name,
             'created_at': org.created_at,
-            'issue_count': issue_count
+            'issue_count': issue_counts.get(org.id, 0)
         })
     return render_template('manage_organisations.html', organizations=org_data)
 
-@app.route('/archive')
+@bp.route('/archive')
 @require_auth
+@read_only
 def archive():
     """View archived issues"""
-    # Get filter parameters
-    status_filter = request.args.get('status', '')
-    owner_filter = request.args.get('owner', '')
-    organization_filter = request.args.get('organization', '')
-    search_query = request.args.get('q', '')
-
-    # Build query - only show archived issues
-    query = Issue.query.filter(Issue.archived == True)
-
-    if status_filter:
-        query = query.filter(Issue.status == status_filter)
-    if owner_filter:
-        query = query.filter(Issue.owner == owner_filter)
-    if organization_filter:
-        query = query.filter(Issue.organization_id == organization_filter)
-    if search_query:
-        query = query.filter(
-            (Issue.title.contains(search_query)) |
-            (Issue.description.contains(search_query)) |
-            (Issue.reporter.contains(search_query))
-        )
-
-    # Sort by date_reported (oldest first)
-    query = query.order_by(Issue.date_reported.asc())
-
-    issues = query.all()
+    filters = current_filters(request.args)
+    # Only archived issues, oldest first
+    issues = cached(_listing_key('archive', filters), lambda: issue_rows(_read_listing('archive', filters)))
 
     # Get filter options
-    statuses = db.session.query(Issue.status).filter(Issue.archived == True).distinct().all()
-    owners = db.session.query(Issue.owner).filter(Issue.owner.isnot(None), Issue.archived == True).distinct().all()
-    organizations = Organization.query.all()
+    statuses, owners, organizations = cached('archive-facets', lambda: _facets(archived=True))
 
     return render_template('archive.html', 
                          issues=issues, 
-                         statuses=[s[0] for s in statuses],
-                         owners=[o[0] for o in owners],
+                         statuses=statuses,
+                         owners=owners,
                          organizations=organizations,
-                         current_filters={
-                             'status': status_filter,
-                             'owner': owner_filter,
-                             'organization': organization_filter,
-                             'q': search_query
-                         })
-
-@app.route('/issues/<int:issue_id>/unarchive', methods=['POST'])
+                         current_filters=filters)
+
+@bp.route('/issues/<int:issue_id>/unarchive', methods=['POST'])
 @require_auth
 def unarchive_issue(issue_id):
     """Unarchive an issue (restore it to active status)"""
-    issue = Issue.query.get_or_404(issue_id)
-    
-    if not issue.archived:
+    version = run_write(_unarchive_issue, issue_id, requested_version(request_data()))
+    if version is None:
         return jsonify({'success': False, 'error': 'Issue is not archived'}), 400
     
-    # Unarchive the issue
-    issue.archived = False
-    issue.updated_at = datetime.utcnow()
+    if is_htmx():
+        return _listing_fragment(issue_id)
+    return jsonify({'success': True, 'version': version})
+
+def _unarchive_issue(issue_id, version=None):
+    """Restore the issue, returning its new version or None if it wasn't archived"""
+    use_issue_shard(issue_id)
+    new_version = _conditional_update(issue_id, version, {'archived': False}, Issue.archived == True)
+    if new_version is None:
+        if not _archived_or_404(issue_id):
+            return None
+        raise StaleIssueError()
+    return new_version
+
+def _listing_page():
+    """Whether an HTMX request came from the archive, and that page's filters"""
+    url = urlsplit(request.headers.get('HX-Current-URL', ''))
+    return url.path == url_for('main.archive'), current_filters(dict(parse_qsl(url.query)))
+
+def _owner_choices(archived):
+    stmt = select(Issue.owner).where(Issue.owner.isnot(None))
+    if archived:
+        stmt = stmt.where(Issue.archived == True)
+    return _distinct(read_issues(stmt.distinct()))
+
+def _facets(archived):
+    """Status, owner and organisation filter options for the board or the archive"""
+    stmt = select(Issue.status).distinct()
+    if archived:
+        stmt = stmt.where(Issue.archived == True)
+    # Plain rows rather than Organization instances, so they can be shared between workers
+    organizations = db.session.execute(select(Organization.id, Organization.name)).all()
+    return _distinct(read_issues(stmt)), _owner_choices(archived), organizations
+
+def _listing_key(view, filters):
+    key = f'{view}?{urlencode(sorted(filters.items()))}'
+    # Which issues are overdue changes at midnight, with no write to bump the version
+    return f'{key}&day={date.today()}' if filters['due'] else key
+
+def _distinct(rows):
+    """First column of each row, without the duplicates a read across shards can have"""
+    return list(dict.fromkeys(value for value, in rows))
+
+def _read_listing(view, filters):
+    stmt, params = listing_statement(view, filters)
+    return read_issues(stmt, params, listing_order(view), organization=filters['organization'])
+
+def _listing_fragment(issue_id=None):
+    """Fragment answering an HTMX issue mutation.
+
+    Renders issue ``issue_id``'s row if it still belongs on the listing page the
+    request came from (it may have been archived, restored or filtered out),
+    plus out-of-band updates for that page's counter and owner filter, so a
+    one-row change costs one row render instead of a full page reload.
+    """
+    archived, filters = _listing_page()
+    stmt, params = listing_statement('archive' if archived else 'board', filters)
     
-    db.session.commit()
-    return jsonify({'success': True})
-
-@app.route('/export.csv')
+    html = ''
+    organization = filters['organization']
+    rows = issue_rows(read_issues(stmt.where(Issue.id == issue_id), params, organization=organization)) \
+        if issue_id is not None else []
+    if rows:
+        html = render_template('_archive_row.html' if archived else '_issue_row.html', issue=rows[0])
+    count = sum(count for count, in read_issues(
+        select(func.count()).select_from(stmt.order_by(None).subquery()), params, organization=organization))
+    return html + render_template('_listing_oob.html',
+                                  count=count,
+                                  owners=_owner_choices(archived),
+                                  current_filters=filters)
+
+def _organization_fragment(organization):
+    """Fragment answering an HTMX organisation create"""
+    if request.headers.get('HX-Target') == 'organizationSelect':
+        # The create issue modal: refresh its options with the new one selected,
+        # and the listing page's organisation filter out of band
+        _, filters = _listing_page()
+        organizations = Organization.query.all()
+        return render_template('_organization_options.html',
+                               organizations=organizations,
+                               placeholder='Select Organisation',
+                               selected=str(organization.id)) + \
+            render_template('_listing_oob.html', organizations=organizations, current_filters=filters)
+    
+    return render_template('_organization_row.html', org={
+        'id': organization.id,
+        'name': organization.name,
+        'created_at': organization.created_at,
+        'issue_count': 0
+    })
+
+@bp.route('/export.csv')
 @require_auth
+@read_only
 def export_csv():
-    # Apply same filters as index
-    status_filter = request.args.get('status', '')
-    owner_filter = request.args.get('owner', '')
-    organization_filter = request.args.get('organization', '')
-    search_query = request.args.get('q', '')
-
-    query = Issue.query
-
-    if status_filter:
-        query = query.filter(Issue.status == status_filter)
-    if owner_filter:
-        query = query.filter(Issue.owner == owner_filter)
-    if organization_filter:
-        query = query.filter(Issue.organization_id == organization_filter)
-    if search_query:
-        query = query.filter(
-            (Issue.title.contains(search_query)) |
-            (Issue.description.contains(search_query)) |
-            (Issue.reporter.contains(search_query))
-        )
-
-    # Always sort by date_reported (oldest first)
-    query = query.order_by(Issue.date_reported.asc())
-    issues = query.all()
+    filters = current_filters(request.args)
 
     output = io.StringIO()
-    writer = csv.writer(output)
+    writer = csv.writer(output, lineterminator='\n')
     
     # Write header
-    writer.writerow(['Title', 'Description', 'Organisation', 'Status', 'Date Reported', 
-                    'Reported By', 'Owner', 'Importance', 'Target Date'])
+    writer.writerow(EXPORT_CSV_HEADER)
     
     # Write data
-    for issue in issues:
-        organization_name = issue.organization.name if issue.organization else ''
-        writer.writerow([
-            issue.title,
-            issue.description or '',
-            organization_name,
-            issue.status,
-            issue.date_reported.strftime('%Y-%m-%d') if issue.date_reported else '',
-            issue.reporter,
-            issue.owner or '',
-            issue.importance,
-            issue.target_date.strftime('%Y-%m-%d') if issue.target_date else ''
-        ])
+    if is_postgresql():
+        # Let the server format the rows with COPY TO STDOUT, sent on as they arrive. Take
+        # the connection now so the stream stays on the replica chosen for this view
+        rows = copy_export_csv(db.session.connection(), *listing_statement('export_csv', filters))
+        body = stream_with_context(_stream_csv(output.getvalue(), rows))
+    else:
+        writer.writerows(export_csv_fields(row) for row in _read_listing('export_csv', filters))
+        body = output.getvalue()
     
-    output.seek(0)
+    return Response(
+        body,
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={export_csv_filename()}'}
+    )
+
+def _stream_csv(header, rows):
+    yield header
+    yield from rows
+
+EXPORT_CSV_HEADER = ['Title', 'Description', 'Organisation', 'Status', 'Date Reported',
+                     'Reported By', 'Owner', 'Importance', 'Target Date']
+
+def export_csv_fields(row):
+    """The CSV fields for a row of the export_csv listing"""
+    title, description, organization_name, status, date_reported, reporter, owner, importance, target_date = row
+    return [
+        title,
+        description or '',
+        organization_name or '',
+        status,
+        date_reported.strftime('%Y-%m-%d') if date_reported else '',
+        reporter,
+        owner or '',
+        importance,
+        target_date.strftime('%Y-%m-%d') if target_date else ''
+    ]
+
+def export_csv_filename():
+    # Stamped with the current date
+    return f"issues_{datetime.now().strftime('%Y-%m-%d')}.csv"
+
+@bp.route('/export.<fmt>')
+@require_auth
+@read_only
+def export_columnar(fmt):
+    """Stream the filtered issues, with organisations and comments, as Parquet or Arrow IPC"""
+    if fmt not in columnar.FORMATS:
+        abort(404)
+    if not columnar.AVAILABLE:
+        flash('Parquet/Arrow export needs pyarrow installed on the server', 'error')
+        return redirect(url_for('main.index'))
     
-    # Generate filename with current date
+    filters = current_filters(request.args)
+    stmt, params = listing_statement('export_columnar', filters)
+    if sharding_enabled():
+        # One shard after another, each in date order
+        stream = _stream_shards(shard_connections(filters['organization']), stmt, fmt, params)
+    else:
+        # Take the connection now so the stream stays on the replica chosen for this view
+        stream = columnar.stream_export(db.session.connection(), stmt, fmt, params)
+    
+    mimetype, extension = columnar.FORMATS[fmt]
     current_date = datetime.now().strftime('%Y-%m-%d')
-    filename = f'issues_{current_date}.csv'
+    filename = f'issues_{current_date}.{extension}'
     
     return Response(
-        output.getvalue(),
-        mimetype='text/csv',
+        stream_with_context(stream),
+        mimetype=mimetype,
         headers={'Content-Disposition': f'attachment; filename={filename}'}
     )
 
-@app.route('/import', methods=['GET', 'POST'])
+def _stream_shards(connections, stmt, fmt, params):
+    try:
+        yield from columnar.stream_export(connections, stmt, fmt, params)
+    finally:
+        for connection in connections:
+            connection.close()
+
+@bp.route('/import', methods=['GET', 'POST'])
 @require_auth
 def import_csv():
     if request.method == 'POST':
         if 'file' not in request.files:
             flash('No file selected', 'error')
-            return redirect(url_for('import_csv'))
+            return redirect(url_for('main.import_csv'))
         
         file = request.files['file']
         if file.filename == '':
             flash('No file selected', 'error')
-            return redirect(url_for('import_csv'))
+            return redirect(url_for('main.import_csv'))
         
         if file and file.filename.endswith('.csv'):
-            # Read CSV
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.DictReader(stream)
-            
-            issues = []
-            for row in csv_input:
-                # Create or get organization (support both Organization and Organisation)
-                organization = None
-                org_name = row.get('Organisation') or row.get('Organization')
-                if org_name:
-                    organization = Organization.query.filter_by(name=org_name).first()
-                    if not organization:
-                        organization = Organization(name=org_name)
-                        db.session.add(organization)
-                        db.session.flush()
-                
-                # Parse dates
-                date_reported = None
-                if row.get('Date Reported'):
-                    try:
-                        date_reported = datetime.strptime(row['Date Reported'], '%Y-%m-%d').date()
-                    except:
-                        pass
-                
-                target_date = None
-                if row.get('Target Date'):
-                    try:
-                        target_date = datetime.strptime(row['Target Date'], '%Y-%m-%d').date()
-                    except:
-                        pass
-                
-                issue = Issue(
-                    title=row.get('Title', ''),
-                    description=row.get('Description', ''),
-                    reporter=row.get('Reporter', ''),
-                    owner=row.get('Owner') or None,
-                    organization_id=organization.id if organization else None,
-                    status=row.get('Status', 'Open'),
-                    importance=row.get('Importance', 'Medium'),
-                    date_reported=date_reported or date.today(),
-                    target_date=target_date
-                )
-                
-                issues.append(issue)
-            
-            # Commit all issues
-            for issue in issues:
-                db.session.add(issue)
+            # Stream the upload rather than decoding it into one big string
+            stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig', newline='')
+            try:
+                result = import_issues(stream, allow_duplicates=bool(request.form.get('allow_duplicates')))
+            except (CSVImportError, UnicodeDecodeError, csv.Error) as e:
+                db.session.rollback()
+                flash(f'Import failed: {e}', 'error')
+                return redirect(url_for('main.import_csv'))
             db.session.commit()
             
-            flash(f'Successfully imported {len(issues)} issues', 'success')
-            return redirect(url_for('index'))
+            skipped = f'; skipped {result.duplicates} likely duplicates' if result.duplicates else ''
+            if result.errors:
+                flash(f'Imported {result.imported} issues{skipped}; {len(result.errors)} problems found, affected rows were skipped', 'error')
+                return render_template('import.html', errors=result.errors[:MAX_IMPORT_ERRORS_SHOWN],
+                                       error_count=len(result.errors))
+            
+            flash(f'Successfully imported {result.imported} issues{skipped}', 'success')
+            return redirect(url_for('main.index'))
     
     return render_template('import.html')
 
-@app.route('/issues/reorder', methods=['POST'])
+@bp.route('/issues/reorder', methods=['POST'])
 @require_auth
 def reorder_issues():
     """Reorder issues based on drag and drop"""
@@ -436,11 +644,7 @@ def reorder_issues():
             return jsonify({'success': False, 'error': 'No issue IDs provided'}), 400
         
         # Update the display_order for each issue based on its position
-        for index, issue_id in enumerate(issue_ids):
-            issue = Issue.query.get(issue_id)
-            if issue:
-                issue.display_order = index
-                issue.updated_at = datetime.utcnow()
+        reorder_issue_rows(issue_ids)
         
         db.session.commit()
         return jsonify({'success': True})
@@ -450,225 +654,264 @@ def reorder_issues():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 def migrate_database():
-    """Add display_order column to existing issues table"""
-    import sqlite3
-    
-    # Check both possible database locations
-    db_paths = ['db.sqlite3', 'instance/db.sqlite3']
-    db_path = None
-    
-    for path in db_paths:
-        if os.path.exists(path):
-            db_path = path
-            break
-    
-    if not db_path:
+    """Add columns introduced after the first release to an existing issue table.
+
+    Goes through SQLAlchemy so the same migrations run on SQLite and PostgreSQL.
+    """
+    if not inspect(db.engine).has_table('issue'):
         print("No database found. This is normal for new deployments.")
         return
     
+    columns = [column['name'] for column in inspect(db.engine).get_columns('issue')]
+    
     try:
-        # Connect to the database
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Check if display_order column already exists
-        cursor.execute("PRAGMA table_info(issue)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'display_order' not in columns:
-            print("Adding display_order column to issue table...")
-            
-            # Add the display_order column
-            cursor.execute("ALTER TABLE issue ADD COLUMN display_order INTEGER DEFAULT 0")
-            
-            # Set display_order for existing issues based on their current order
-            cursor.execute("SELECT id FROM issue ORDER BY date_reported ASC")
-            issue_ids = cursor.fetchall()
-            
-            for index, (issue_id,) in enumerate(issue_ids):
-                cursor.execute("UPDATE issue SET display_order = ? WHERE id = ?", (index, issue_id))
-            
-            conn.commit()
-            print(f"Successfully migrated {len(issue_ids)} issues with display_order")
-        
-        # Check if archived column exists
-        if 'archived' not in columns:
-            print("Adding archived column to issue table...")
-            
-            # Add the archived column
-            cursor.execute("ALTER TABLE issue ADD COLUMN archived BOOLEAN DEFAULT 0")
+        with db.engine.begin() as conn:
+            if 'display_order' not in columns:
+                print("Adding display_order column to issue table...")
+                
+                # Add the display_order column
+                conn.execute(text("ALTER TABLE issue ADD COLUMN display_order INTEGER DEFAULT 0"))
+                
+                # Set display_order for existing issues based on their current order
+                issue_ids = conn.execute(text("SELECT id FROM issue ORDER BY date_reported ASC")).scalars().all()
+                if issue_ids:
+                    conn.execute(
+                        text("UPDATE issue SET display_order = :position WHERE id = :id"),
+                        [{'position': index, 'id': issue_id} for index, issue_id in enumerate(issue_ids)]
+                    )
+                
+                print(f"Successfully migrated {len(issue_ids)} issues with display_order")
             
-            # Auto-archive any existing completed issues
-            cursor.execute("UPDATE issue SET archived = 1 WHERE status = 'Completed'")
+            # Check if archived column exists
+            if 'archived' not in columns:
+                print("Adding archived column to issue table...")
+                
+                # Add the archived column
+                conn.execute(text("ALTER TABLE issue ADD COLUMN archived BOOLEAN DEFAULT FALSE"))
+                
+                # Auto-archive any existing completed issues
+                conn.execute(text("UPDATE issue SET archived = TRUE WHERE status = 'Completed'"))
+                
+                print("Successfully added archived column and auto-archived completed issues")
             
-            conn.commit()
-            print("Successfully added archived column and auto-archived completed issues")
-        
-        conn.close()
+            if 'version' not in columns:
+                print("Adding version column to issue table...")
+                conn.execute(text("ALTER TABLE issue ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
         
     except Exception as e:
         print(f"Migration failed: {e}")
-        if 'conn' in locals():
-            conn.close()
 
 def init_db():
-    """Initialize database with sample data"""
+    """Run migrations and create any missing tables"""
     # Run migration first, before any SQLAlchemy operations
     migrate_database()
     
-    with app.app_context():
-        # Create all tables (this will not affect existing tables)
-        db.create_all()
+    # Create all tables (this will not affect existing tables)
+    db.create_all()
+    create_issue_indexes(db.engine)
+    
+    if sharding_enabled():
+        if use_unique_organization_ids():
+            print("Rebuilt the organization table so deleted organisation ids aren't reused")
+        moved = move_primary_issues_to_shards()
+        if moved:
+            print(f"Moved {moved} issues into per-organisation shards")
+
+def seed_db():
+    """Load sample data into an empty database"""
+    # Create sample organisations
+    if not Organization.query.first():
+        organizations = [
+            Organization(name='HAL Platform'),
+            Organization(name='Data Views'),
+            Organization(name='Contract Management'),
+            Organization(name='Document History'),
+            Organization(name='Form Builder'),
+            Organization(name='Data Manager')
+        ]
+        for organization in organizations:
+            db.session.add(organization)
+        db.session.commit()
+    
+    # Create sample issues based on the Excel data
+    if not read_issues(select(Issue.id).limit(1)):
+        organizations = {o.name: o for o in Organization.query.all()}
         
-        # Create sample organisations
-        if not Organization.query.first():
-            organizations = [
-                Organization(name='HAL Platform'),
-                Organization(name='Data Views'),
-                Organization(name='Contract Management'),
-                Organization(name='Document History'),
-                Organization(name='Form Builder'),
-                Organization(name='Data Manager')
-            ]
-            for organization in organizations:
-                db.session.add(organization)
-            db.session.commit()
+        sample_issues = [
+            {
+                'title': 'HAL issue',
+                'description': 'HAL platform issue.',
+                'reporter': 'Prith',
+                'owner': 'Neeraj',
+                'organization': 'HAL Platform',
+                'status': 'In Progress',
+                'importance': 'High',
+                'date_reported': '2025-09-22'
+            },
+            {
+                'title': 'Data views issue',
+                'description': 'Table layout saves filters, segments, formatting but cannot save column order or selected columns. Planned for future builds.',
+                'reporter': 'Prith',
+                'owner': 'Neeraj',
+                'organization': 'Data Views',
+                'status': 'In Progress',
+                'importance': 'Medium',
+                'date_reported': '2025-08-27'
+            },
+            {
+                'title': 'Contract price tables',
+                'description': 'Contract price tables issue.',
+                'reporter': 'Smit',
+                'owner': None,
+                'organization': 'Contract Management',
+                'status': 'Open',
+                'importance': 'Medium',
+                'date_reported': '2025-09-09'
+            },
+            {
+                'title': 'Redcentric job ID inconsistent assignment',
+                'description': 'Reprocessing requires 2 attempts for correct job ID assignment. Raised after Richard\'s job ID task.',
+                'reporter': 'Gleb',
+                'owner': 'Eldho',
+                'organization': 'Data Manager',
+                'status': 'Completed',
+                'importance': 'High',
+                'date_reported': '2025-09-11'
+            },
+            {
+                'title': 'Simfoni exceptions page',
+                'description': 'Exceptions page issue.',
+                'reporter': 'Gleb',
+                'owner': 'Aswin',
+                'organization': 'Data Views',
+                'status': 'In Progress',
+                'importance': 'Medium',
+                'date_reported': '2025-09-15'
+            },
+            {
+                'title': 'Database/Document History sort by timestamp',
+                'description': 'Request to add descending sort by timestamp.',
+                'reporter': 'Gleb',
+                'owner': 'Aswin',
+                'organization': 'Document History',
+                'status': 'In Progress',
+                'importance': 'Low',
+                'date_reported': '2025-09-15'
+            },
+            {
+                'title': 'Renae Caliber invoice issue',
+                'description': 'Awaiting additional info from Renae.',
+                'reporter': 'Renae',
+                'owner': None,
+                'organization': 'Contract Management',
+                'status': 'Pending Info',
+                'importance': 'Medium',
+                'date_reported': '2025-09-24'
+            },
+            {
+                'title': 'Data-view (DuckDB performance)',
+                'description': 'DuckDB currently loads all data at once, causing performance issues. Updating to fetch in chunks with SQL queries.',
+                'reporter': 'Richard',
+                'owner': None,
+                'organization': 'Data Views',
+                'status': 'In Progress',
+                'importance': 'High',
+                'date_reported': '2025-09-24'
+            },
+            {
+                'title': 'Form builder for insights page',
+                'description': 'Form builder issue.',
+                'reporter': 'Richard',
+                'owner': None,
+                'organization': 'Form Builder',
+                'status': 'Open',
+                'importance': 'Low',
+                'date_reported': '2025-09-24'
+            },
+            {
+                'title': 'Data Manager - editing & updating',
+                'description': 'Allow editing/updating data back into database from frontend (e.g. contract management).',
+                'reporter': 'Richard',
+                'owner': 'Gleb',
+                'organization': 'Data Manager',
+                'status': 'Open',
+                'importance': 'Medium',
+                'date_reported': '2025-09-26'
+            },
+            {
+                'title': 'Document history page issue (Redcentric)',
+                'description': 'Not urgent issue on document history page.',
+                'reporter': 'Richard',
+                'owner': None,
+                'organization': 'Document History',
+                'status': 'Open',
+                'importance': 'Low',
+                'date_reported': '2025-09-10'
+            }
+        ]
         
-        # Create sample issues based on the Excel data
-        if not Issue.query.first():
-            organizations = {o.name: o for o in Organization.query.all()}
+        issues = []
+        for issue_data in sample_issues:
+            organization = organizations.get(issue_data['organization'])
             
-            sample_issues = [
-                {
-                    'title': 'HAL issue',
-                    'description': 'HAL platform issue.',
-                    'reporter': 'Prith',
-                    'owner': 'Neeraj',
-                    'organization': 'HAL Platform',
-                    'status': 'In Progress',
-                    'importance': 'High',
-                    'date_reported': '2025-09-22'
-                },
-                {
-                    'title': 'Data views issue',
-                    'description': 'Table layout saves filters, segments, formatting but cannot save column order or selected columns. Planned for future builds.',
-                    'reporter': 'Prith',
-                    'owner': 'Neeraj',
-                    'organization': 'Data Views',
-                    'status': 'In Progress',
-                    'importance': 'Medium',
-                    'date_reported': '2025-08-27'
-                },
-                {
-                    'title': 'Contract price tables',
-                    'description': 'Contract price tables issue.',
-                    'reporter': 'Smit',
-                    'owner': None,
-                    'organization': 'Contract Management',
-                    'status': 'Open',
-                    'importance': 'Medium',
-                    'date_reported': '2025-09-09'
-                },
-                {
-                    'title': 'Redcentric job ID inconsistent assignment',
-                    'description': 'Reprocessing requires 2 attempts for correct job ID assignment. Raised after Richard\'s job ID task.',
-                    'reporter': 'Gleb',
-                    'owner': 'Eldho',
-                    'organization': 'Data Manager',
-                    'status': 'Completed',
-                    'importance': 'High',
-                    'date_reported': '2025-09-11'
-                },
-                {
-                    'title': 'Simfoni exceptions page',
-                    'description': 'Exceptions page issue.',
-                    'reporter': 'Gleb',
-                    'owner': 'Aswin',
-                    'organization': 'Data Views',
-                    'status': 'In Progress',
-                    'importance': 'Medium',
-                    'date_reported': '2025-09-15'
-                },
-                {
-                    'title': 'Database/Document History sort by timestamp',
-                    'description': 'Request to add descending sort by timestamp.',
-                    'reporter': 'Gleb',
-                    'owner': 'Aswin',
-                    'organization': 'Document History',
-                    'status': 'In Progress',
-                    'importance': 'Low',
-                    'date_reported': '2025-09-15'
-                },
-                {
-                    'title': 'Renae Caliber invoice issue',
-                    'description': 'Awaiting additional info from Renae.',
-                    'reporter': 'Renae',
-                    'owner': None,
-                    'organization': 'Contract Management',
-                    'status': 'Pending Info',
-                    'importance': 'Medium',
-                    'date_reported': '2025-09-24'
-                },
-                {
-                    'title': 'Data-view (DuckDB performance)',
-                    'description': 'DuckDB currently loads all data at once, causing performance issues. Updating to fetch in chunks with SQL queries.',
-                    'reporter': 'Richard',
-                    'owner': None,
-                    'organization': 'Data Views',
-                    'status': 'In Progress',
-                    'importance': 'High',
-                    'date_reported': '2025-09-24'
-                },
-                {
-                    'title': 'Form builder for insights page',
-                    'description': 'Form builder issue.',
-                    'reporter': 'Richard',
-                    'owner': None,
-                    'organization': 'Form Builder',
-                    'status': 'Open',
-                    'importance': 'Low',
-                    'date_reported': '2025-09-24'
-                },
-                {
-                    'title': 'Data Manager - editing & updating',
-                    'description': 'Allow editing/updating data back into database from frontend (e.g. contract management).',
-                    'reporter': 'Richard',
-                    'owner': 'Gleb',
-                    'organization': 'Data Manager',
-                    'status': 'Open',
-                    'importance': 'Medium',
-                    'date_reported': '2025-09-26'
-                },
-                {
-                    'title': 'Document history page issue (Redcentric)',
-                    'description': 'Not urgent issue on document history page.',
-                    'reporter': 'Richard',
-                    'owner': None,
-                    'organization': 'Document History',
-                    'status': 'Open',
-                    'importance': 'Low',
-                    'date_reported': '2025-09-10'
-                }
-            ]
-            
-            for issue_data in sample_issues:
-                organization = organizations.get(issue_data['organization'])
-                
-                issue = Issue(
-                    title=issue_data['title'],
-                    description=issue_data['description'],
-                    reporter=issue_data['reporter'],
-                    owner=issue_data['owner'],
-                    organization_id=organization.id if organization else None,
-                    status=issue_data['status'],
-                    importance=issue_data['importance'],
-                    date_reported=datetime.strptime(issue_data['date_reported'], '%Y-%m-%d').date()
-                )
-                db.session.add(issue)
-            
-            db.session.commit()
+            issue = Issue(
+                title=issue_data['title'],
+                description=issue_data['description'],
+                reporter=issue_data['reporter'],
+                owner=issue_data['owner'],
+                organization_id=organization.id if organization else None,
+                status=issue_data['status'],
+                importance=issue_data['importance'],
+                date_reported=datetime.strptime(issue_data['date_reported'], '%Y-%m-%d').date()
+            )
+            add_issue(issue)
+            issues.append(issue)
+        
+        db.session.flush()
+        index_issues((issue.id, issue.title, issue.description) for issue in issues)
+        db.session.commit()
 
-if __name__ == '__main__':
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Run migrations and create tables. Run once per deploy, not per worker."""
     init_db()
+    click.echo('Database initialised.')
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Load the sample organisations and issues into an empty database."""
+    seed_db()
+    click.echo('Sample data loaded.')
+
+@click.command('dedup')
+@click.option('--archive', is_flag=True, help='Archive each duplicate, keeping the oldest issue.')
+@with_appcontext
+def dedup_command(archive):
+    """Rebuild the duplicate index and list the near-duplicate issues already stored."""
+    duplicates = rebuild_index()
+    for issue_id, original_id in duplicates.items():
+        click.echo(f'#{issue_id} looks like a duplicate of #{original_id}')
+        if archive:
+            use_issue_shard(issue_id)
+            _conditional_update(issue_id, None, {'archived': True}, Issue.archived == False)
+    db.session.commit()
+    click.echo(f'{len(duplicates)} likely duplicates {"archived" if archive else "found"}.')
+
+@click.command('snapshot-replica')
+@with_appcontext
+def snapshot_replica_command():
+    """Refresh a SQLite read replica from the primary. Run periodically, e.g. from cron."""
+    if replica_engine() is None:
+        raise click.ClickException('REPLICA_DATABASE_URL is not configured.')
+    primary, replica = db.engine.url, replica_engine().url
+    if primary.get_backend_name() != 'sqlite' or replica.get_backend_name() != 'sqlite':
+        raise click.ClickException('snapshot-replica only copies SQLite databases; use native replication otherwise.')
+    snapshot_sqlite_replica(primary.database, replica.database)
+    click.echo(f'Replica refreshed: {replica.database}')
+
+if __name__ == '__main__':
+    app = create_app()
     port = int(os.environ.get('PORT', 5001))
     app.run(debug=True, host='0.0.0.0', port=port)
@@ -0,0 +1,192 @@
+"""
+ASGI serving mode, for many slow or long-lived connections:
+
+    uvicorn --factory asgi:create_asgi_app
+
+Under gunicorn every request holds a worker thread until it finishes, so a
+few hundred slow CSV downloads or open live-update connections use up the
+pool. Here those endpoints run on the event loop instead, with async
+database access (aiosqlite or asyncpg), and cost no thread while they wait:
+
+- /export.csv streams the export in batches as rows arrive;
+- /changes is a Server-Sent Events feed of changed issues. One poller per
+  process reads the issues updated since its last pass every
+  CHANGE_FEED_SECONDS and sends the ones at a new version to every open feed.
+
+Every other route is the unchanged Flask app, run in a thread pool behind a
+WSGI adapter. Needs starlette, uvicorn, a2wsgi and aiosqlite (asyncpg on
+PostgreSQL), and can't be combined with SHARDS_DIR.
+"""
+import asyncio
+import csv
+import io
+import json
+import time
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timedelta
+from a2wsgi import WSGIMiddleware
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.applications import Starlette
+from starlette.responses import RedirectResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from app import create_app, EXPORT_CSV_HEADER, export_csv_fields, export_csv_filename
+from models import db, Issue
+from filters import current_filters, listing_statement
+from backends import async_database_url, configure_sqlite
+
+# Rows read and written per chunk of a streamed export
+EXPORT_BATCH_SIZE = 1000
+
+# A comment line keeps idle feeds from being closed by proxies
+KEEPALIVE_SECONDS = 15
+
+# Writes to updated_at land before their commit does, so each poll reads back this far
+POLL_OVERLAP = timedelta(seconds=10)
+
+# Changes held for a feed that isn't reading; it misses the rest until it catches up
+FEED_BACKLOG = 100
+
+def create_asgi_app(config=None):
+    flask_app = create_app(config)
+    if flask_app.config.get('SHARDS_DIR'):
+        raise ValueError('The ASGI server cannot be combined with SHARDS_DIR')
+
+    with flask_app.app_context():
+        # Flask-SQLAlchemy puts a relative SQLite path in the instance folder; use the file it resolved
+        primary_url = db.engine.url
+    primary = create_async_engine(async_database_url(primary_url))
+    configure_sqlite(flask_app, primary.sync_engine)
+    replica = None
+    if flask_app.config.get('REPLICA_DATABASE_URL'):
+        url = async_database_url(flask_app.config['REPLICA_DATABASE_URL'])
+        # As in routing.py: a snapshotted SQLite replica is replaced by renaming over it
+        replica = create_async_engine(url, poolclass=NullPool) if url.get_backend_name() == 'sqlite' \
+            else create_async_engine(url)
+    feed = ChangeFeed(primary, flask_app.config['CHANGE_FEED_SECONDS'], flask_app.logger)
+
+    def flask_session(request):
+        """The Flask session from the request's cookie, or {} if it has none or it's invalid"""
+        cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+        serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        if not cookie or serializer is None:
+            return {}
+        try:
+            return serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return {}
+
+    def read_engine(session):
+        # Same rule as RoutingSession: the replica, unless this browser wrote recently
+        last_write = session.get('last_write')
+        sticky = flask_app.config['REPLICA_STICKY_SECONDS']
+        if replica is not None and (last_write is None or time.time() - last_write > sticky):
+            return replica
+        return primary
+
+    async def export_csv(request):
+        session = flask_session(request)
+        if not session.get('authenticated'):
+            return RedirectResponse('/login', status_code=302)
+        stmt, params = listing_statement('export_csv', current_filters(request.query_params))
+
+        async def chunks():
+            yield _csv_lines([EXPORT_CSV_HEADER])
+            async with read_engine(session).connect() as connection:
+                result = await connection.stream(stmt, params)
+                async for rows in result.partitions(EXPORT_BATCH_SIZE):
+                    yield _csv_lines(export_csv_fields(row) for row in rows)
+
+        return StreamingResponse(chunks(), media_type='text/csv', headers={
+            'Content-Disposition': f'attachment; filename={export_csv_filename()}'
+        })
+
+    async def changes(request):
+        if not flask_session(request).get('authenticated'):
+            return RedirectResponse('/login', status_code=302)
+
+        async def events():
+            with feed.subscribe() as queue:
+                while True:
+                    try:
+                        issues = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ': keepalive\n\n'
+                        continue
+                    yield f'event: issues\ndata: {json.dumps(issues)}\n\n'
+
+        return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        await feed.stop()
+        await primary.dispose()
+        if replica is not None:
+            await replica.dispose()
+
+    return Starlette(routes=[
+        Route('/export.csv', export_csv),
+        Route('/changes', changes),
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ], lifespan=lifespan)
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+class ChangeFeed:
+    """One poller per process, fanning changed issues out to every open /changes feed"""
+
+    def __init__(self, engine, interval, logger):
+        self.engine = engine
+        self.interval = interval
+        self.logger = logger
+        self._queues = set()
+        self._poller = None
+
+    @contextmanager
+    def subscribe(self):
+        """A queue receiving each list of changed issues while the with block runs"""
+        queue = asyncio.Queue(FEED_BACKLOG)
+        self._queues.add(queue)
+        # The poller only runs while someone is listening
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            yield queue
+        finally:
+            self._queues.discard(queue)
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+
+    async def _poll(self):
+        since = datetime.utcnow()
+        versions = {}
+        while self._queues:
+            await asyncio.sleep(self.interval)
+            started = datetime.utcnow()
+            try:
+                async with self.engine.connect() as connection:
+                    rows = (await connection.execute(
+                        select(Issue.id, Issue.version, Issue.archived)
+                        .where(Issue.updated_at >= since - POLL_OVERLAP)
+                    )).all()
+            except Exception:
+                self.logger.exception('Change feed poll failed')
+                continue
+
+            # Issues read back by the overlap are only sent again if they changed since
+            changed = [{'id': issue_id, 'version': version, 'archived': archived}
+                       for issue_id, version, archived in rows if versions.get(issue_id) != version]
+            versions = {issue_id: version for issue_id, version, _ in rows}
+            since = started
+            if changed:
+                for queue in self._queues:
+                    if not queue.full():
+                        queue.put_nowait(changed)
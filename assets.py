@@ -0,0 +1,153 @@
+"""
+Precompiled static assets.
+
+`flask --app app build-assets` compiles a purged, minified Tailwind
+stylesheet and bundles the page scripts (with HTMX vendored into app.js),
+writing content-hashed files plus .gz/.br variants into static/dist with a
+manifest.json. At runtime asset_url() resolves names through the manifest
+and /assets/ serves the precompressed variant the browser accepts, with
+immutable cache headers.
+
+Until the assets are built, templates fall back to the Tailwind/HTMX CDNs
+and the unbundled scripts in static/js so development needs no build step.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import urllib.request
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+HTMX_VERSION = '1.9.10'
+HTMX_URL = f'https://unpkg.com/htmx.org@{HTMX_VERSION}/dist/htmx.min.js'
+
+# Output name -> source files under static/, concatenated in order
+BUNDLES = {
+    'app.js': ['vendor/htmx.min.js', 'js/app.js'],
+    'index.js': ['js/index.js'],
+    'archive.js': ['js/archive.js'],
+    'manage_organisations.js': ['js/manage_organisations.js'],
+}
+
+ONE_YEAR = 60 * 60 * 24 * 365
+
+def init_assets(app):
+    app.config.setdefault('ASSETS_DIST_FOLDER', os.path.join(app.static_folder, 'dist'))
+    app.extensions['assets_manifest'] = _load_manifest(app.config['ASSETS_DIST_FOLDER'])
+
+    app.add_url_rule('/assets/<path:filename>', 'asset', serve_asset)
+    app.cli.add_command(build_assets_command)
+
+    @app.context_processor
+    def asset_helpers():
+        return {
+            'asset_url': asset_url,
+            'assets_built': bool(current_app.extensions['assets_manifest']),
+            'htmx_version': HTMX_VERSION,
+        }
+
+def asset_url(name):
+    manifest = current_app.extensions['assets_manifest']
+    if name in manifest:
+        return url_for('asset', filename=manifest[name])
+    return url_for('static', filename=f'js/{name}')
+
+def serve_asset(filename):
+    """Serve a hashed asset, preferring a precompressed variant"""
+    dist = current_app.config['ASSETS_DIST_FOLDER']
+    mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.exists(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype)
+
+    response.headers['Vary'] = 'Accept-Encoding'
+    # The name changes whenever the content does, so it can be cached forever
+    response.headers['Cache-Control'] = f'public, max-age={ONE_YEAR}, immutable'
+    return response
+
+def build_assets(static_folder, dist_folder, compile_css):
+    """Write hashed, precompressed bundles and return the manifest"""
+    if os.path.isdir(dist_folder):
+        shutil.rmtree(dist_folder)
+    os.makedirs(dist_folder)
+
+    outputs = {'app.css': compile_css() + _read(static_folder, 'css/components.css')}
+    for name, sources in BUNDLES.items():
+        outputs[name] = b'\n;\n'.join(_read(static_folder, source) for source in sources)
+
+    manifest = {}
+    for name, content in outputs.items():
+        stem, extension = os.path.splitext(name)
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        hashed_name = f'{stem}.{digest}{extension}'
+        _write(dist_folder, hashed_name, content)
+        _write(dist_folder, hashed_name + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(dist_folder, hashed_name + '.br', brotli.compress(content))
+        manifest[name] = hashed_name
+
+    _write(dist_folder, 'manifest.json', json.dumps(manifest, indent=2).encode())
+    return manifest
+
+def compile_tailwind(root_path):
+    """Run the Tailwind CLI (TAILWIND_BIN, tailwindcss on PATH, or npx) and return the CSS"""
+    command = [os.environ.get('TAILWIND_BIN', 'tailwindcss')]
+    if shutil.which(command[0]) is None:
+        command = ['npx', '--yes', 'tailwindcss@3']
+    result = subprocess.run(
+        command + ['-c', 'tailwind.config.js', '-i', 'static/src/app.css', '--minify'],
+        cwd=root_path, check=True, capture_output=True
+    )
+    return result.stdout
+
+def vendor_htmx(static_folder):
+    """Download the pinned HTMX release into static/vendor if it isn't there yet"""
+    path = os.path.join(static_folder, 'vendor', 'htmx.min.js')
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(HTMX_URL) as response:
+            _write(os.path.dirname(path), 'htmx.min.js', response.read())
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Compile, hash and precompress the CSS/JS bundles into static/dist."""
+    app = current_app
+    vendor_htmx(app.static_folder)
+    manifest = build_assets(
+        app.static_folder, app.config['ASSETS_DIST_FOLDER'],
+        lambda: compile_tailwind(app.root_path)
+    )
+    for name, hashed_name in manifest.items():
+        click.echo(f'{name} -> {hashed_name}')
+    if brotli is None:
+        click.echo('brotli not installed: only .gz variants were written')
+
+def _load_manifest(dist_folder):
+    try:
+        with open(os.path.join(dist_folder, 'manifest.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _read(folder, name):
+    with open(os.path.join(folder, name), 'rb') as f:
+        return f.read()
+
+def _write(folder, name, content):
+    with open(os.path.join(folder, name), 'wb') as f:
+        f.write(content)
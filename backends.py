@@ -0,0 +1,271 @@
+"""
+Database backend helpers.
+
+The app runs on SQLite out of the box and on PostgreSQL when DATABASE_URL
+points at one. Everything that has to be written differently per dialect
+lives here so the routes stay backend-agnostic.
+"""
+import io
+import queue
+import re
+import threading
+from datetime import date, datetime
+from sqlalchemy import case, column, event, insert, make_url, text, update, values, Integer
+from models import db, Issue
+
+def normalize_database_url(url):
+    """Pin PostgreSQL URLs to psycopg2, whose COPY support the bulk paths use.
+
+    Also accepts the postgres:// scheme that Heroku/Railway hand out.
+    """
+    for scheme in ('postgres://', 'postgresql://'):
+        if url.startswith(scheme):
+            return 'postgresql+psycopg2://' + url[len(scheme):]
+    return url
+
+def async_database_url(url):
+    """The same database through its asyncio driver: aiosqlite or asyncpg"""
+    url = make_url(url)
+    return url.set(drivername='postgresql+asyncpg' if url.get_backend_name() == 'postgresql' else 'sqlite+aiosqlite')
+
+def is_postgresql():
+    return db.engine.dialect.name == 'postgresql'
+
+def configure_sqlite(app, engine=None):
+    """Run SQLITE_PRAGMAS on every new connection to a SQLite primary (or ``engine``).
+
+    SQLITE_PRAGMAS is a comma-separated list such as
+    ``journal_mode=wal,synchronous=normal,busy_timeout=5000``.
+    """
+    pragmas = []
+    for item in (app.config.get('SQLITE_PRAGMAS') or '').split(','):
+        if not item.strip():
+            continue
+        name, _, value = (part.strip() for part in item.partition('='))
+        if not re.fullmatch(r'\w+', name) or not re.fullmatch(r'\w+', value):
+            raise ValueError(f'Invalid SQLITE_PRAGMAS entry: {item!r}')
+        pragmas.append((name, value))
+    if not pragmas:
+        return
+
+    if engine is None:
+        with app.app_context():
+            engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+def begin_write(session):
+    """Open ``session``'s write transaction explicitly on SQLite.
+
+    pysqlite only starts a transaction implicitly before DML, so a batch that
+    opens with a SAVEPOINT would run outside one and each RELEASE would
+    commit. BEGIN IMMEDIATE also takes the write lock up front, instead of
+    failing to upgrade a read lock halfway through the batch.
+    """
+    connection = session.connection()
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+def search_pattern(search_query):
+    """LIKE pattern matching ``search_query`` anywhere, with wildcards escaped by '/'"""
+    escaped = search_query.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return f'%{escaped}%'
+
+def search_filter(pattern):
+    """Case-insensitive match of a search_pattern() on title, description and reporter.
+
+    Takes the pattern as a bound parameter so the statement can be cached.
+    Renders as ILIKE on PostgreSQL, where the pg_trgm GIN indexes on these
+    columns serve it, and as lower(...) LIKE lower(...) elsewhere.
+    """
+    return (
+        Issue.title.ilike(pattern, escape='/') |
+        Issue.description.ilike(pattern, escape='/') |
+        Issue.reporter.ilike(pattern, escape='/')
+    )
+
+def reorder_issues(issue_ids, orders=None):
+    """Set display_order from list position (or ``orders``) in a single UPDATE statement"""
+    now = datetime.utcnow()
+    if orders is None:
+        orders = range(len(issue_ids))
+    positions = [(int(issue_id), order) for issue_id, order in zip(issue_ids, orders)]
+
+    if is_postgresql():
+        # UPDATE issue SET ... FROM (VALUES (id, ord), ...) AS v(id, ord) WHERE issue.id = v.id
+        new_order = values(
+            column('id', Integer), column('ord', Integer), name='new_order'
+        ).data(positions)
+        stmt = (
+            update(Issue)
+            .where(Issue.id == new_order.c.id)
+            .values(display_order=new_order.c.ord, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        # SQLite has no column aliases on VALUES, so use a CASE over the ids
+        stmt = (
+            update(Issue)
+            .where(Issue.id.in_([issue_id for issue_id, _ in positions]))
+            .values(
+                display_order=case(dict(positions), value=Issue.id),
+                updated_at=now
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    db.session.execute(stmt)
+
+ISSUE_COPY_COLUMNS = [
+    'id', 'title', 'description', 'reporter', 'owner', 'organization_id', 'status',
+    'importance', 'date_reported', 'target_date', 'display_order', 'archived',
+    'created_at', 'updated_at'
+]
+
+# The CSV export's COPY output is sent in chunks of about this many characters
+COPY_CHUNK_SIZE = 64 * 1024
+# Chunks the copy may run ahead of a slow client before it waits
+COPY_CHUNKS_AHEAD = 16
+
+def bulk_insert_issues(rows):
+    """Insert a list of issue dicts in one round trip, filling in each row's ``id``.
+
+    On PostgreSQL this streams the rows through COPY FROM STDIN, with ids
+    taken from the issue sequence first; elsewhere it is a single
+    executemany INSERT.
+    """
+    if not rows:
+        return
+
+    now = datetime.utcnow()
+    for row in rows:
+        # COPY bypasses the model's Python-side defaults, so fill them in here
+        row.setdefault('display_order', 0)
+        row.setdefault('archived', False)
+        row.setdefault('created_at', now)
+        row.setdefault('updated_at', now)
+
+    if not is_postgresql():
+        if all('id' in row for row in rows):
+            db.session.execute(insert(Issue), rows)
+            return
+        issue_ids = db.session.execute(
+            insert(Issue).returning(Issue.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        for row, issue_id in zip(rows, issue_ids):
+            row['id'] = issue_id
+        return
+
+    missing = [row for row in rows if 'id' not in row]
+    if missing:
+        issue_ids = db.session.execute(
+            text("SELECT nextval(pg_get_serial_sequence('issue', 'id')) FROM generate_series(1, :count)"),
+            {'count': len(missing)}
+        ).scalars().all()
+        for row, issue_id in zip(missing, issue_ids):
+            row['id'] = issue_id
+
+    # Raw COPY bypasses the ORM, so flag the write for replica routing ourselves
+    db.session.info['wrote'] = True
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_copy_field(row.get(name)) for name in ISSUE_COPY_COLUMNS))
+        buffer.write('\n')
+    buffer.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY issue ({', '.join(ISSUE_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def copy_export_csv(connection, stmt, params=None):
+    """Run a SELECT through PostgreSQL's COPY TO STDOUT and yield the CSV rows as they arrive.
+
+    psycopg2's copy_expert() only returns once the whole COPY is done, so it
+    runs in a thread writing chunks into a bounded queue that this generator
+    drains; a slow client holds the copy back rather than the export piling
+    up in memory. Closing the generator early cancels the query.
+    """
+    compiled = stmt.compile(dialect=connection.dialect)
+    dbapi_connection = connection.connection.dbapi_connection
+    chunks = queue.Queue(COPY_CHUNKS_AHEAD)
+
+    def copy():
+        cursor = dbapi_connection.cursor()
+        try:
+            # mogrify binds the filter parameters client-side with proper quoting
+            sql = cursor.mogrify(str(compiled), compiled.construct_params(params)).decode()
+            output = _ChunkWriter(chunks)
+            cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv)', output)
+            output.flush()
+        except Exception as error:
+            chunks.put(error)
+        finally:
+            cursor.close()
+            chunks.put(None)
+
+    thread = threading.Thread(target=copy, daemon=True)
+    thread.start()
+    finished = False
+    try:
+        while (chunk := chunks.get()) is not None:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+        finished = True
+    finally:
+        if not finished:
+            # Stop the server sending rows nobody will read, and let the thread finish
+            dbapi_connection.cancel()
+            while chunks.get() is not None:
+                pass
+        thread.join()
+
+class _ChunkWriter(io.TextIOBase):
+    """Collects COPY output, which psycopg2 writes a row at a time, into queued chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = []
+        self._size = 0
+
+    def write(self, data):
+        self._buffer.append(data)
+        self._size += len(data)
+        if self._size >= COPY_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._buffer:
+            self._chunks.put(''.join(self._buffer))
+            self._buffer, self._size = [], 0
+
+def _copy_field(value):
+    """Format one value for COPY ... WITH (FORMAT csv).
+
+    Unquoted empty fields are NULL and quoted ones are empty strings, so
+    strings are always quoted.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
@@ -0,0 +1,135 @@
+"""
+Columnar analytics export (Parquet and Arrow IPC stream).
+
+Issues are read in batches of BATCH_SIZE rows, transposed into columns and
+converted to Arrow arrays a whole column at a time, with each issue's
+comments attached as a list<struct> column. Every batch is written out as
+soon as it is built, so the response streams instead of buffering the
+whole export in memory.
+
+pyarrow is optional: if it is not installed, AVAILABLE is False and the
+export routes say so instead of failing at import time. It is only imported
+by the first export, as loading it would add to every worker's boot.
+"""
+import io
+from importlib.util import find_spec
+from itertools import groupby
+from sqlalchemy import select
+from models import Comment
+
+AVAILABLE = find_spec('pyarrow') is not None
+
+BATCH_SIZE = 5000
+
+FORMATS = {
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+# Issue columns in schema order; the comments column is appended per batch
+ISSUE_FIELDS = [
+    ('id', 'int64'),
+    ('title', 'string'),
+    ('description', 'string'),
+    ('organisation', 'string'),
+    ('status', 'string'),
+    ('importance', 'string'),
+    ('reporter', 'string'),
+    ('owner', 'string'),
+    ('date_reported', 'date32'),
+    ('target_date', 'date32'),
+    ('display_order', 'int32'),
+    ('archived', 'bool'),
+    ('created_at', 'timestamp[us]'),
+    ('updated_at', 'timestamp[us]'),
+]
+
+def issue_schema():
+    import pyarrow as pa
+    comment_type = pa.struct([
+        ('author', pa.string()),
+        ('body', pa.string()),
+        ('created_at', pa.timestamp('us')),
+    ])
+    return pa.schema(
+        [pa.field(name, pa.type_for_alias(type_name)) for name, type_name in ISSUE_FIELDS] +
+        [pa.field('comments', pa.list_(comment_type))]
+    )
+
+def stream_export(connection, stmt, fmt, params=None, batch_size=BATCH_SIZE):
+    """Yield the encoded export for ``stmt`` (bound with ``params``) chunk by chunk.
+
+    ``stmt`` must select the ISSUE_FIELDS columns in order. ``connection`` is
+    held for the lifetime of the stream, so callers choose primary or replica.
+    It can also be a list of connections, one per shard, exported in turn.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    connections = connection if isinstance(connection, list) else [connection]
+    schema = issue_schema()
+    sink = _ChunkSink()
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    else:
+        writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+
+    for connection in connections:
+        result = connection.execution_options(yield_per=batch_size).execute(stmt, params)
+        for rows in result.partitions():
+            writer.write_batch(_record_batch(connection, schema, rows))
+            yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+def _record_batch(connection, schema, rows):
+    import pyarrow as pa
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array(values, type=field.type)
+        for values, field in zip(columns, schema)
+    ]
+
+    # One query for the whole batch's comments, grouped back onto the issue ids
+    issue_ids = columns[0]
+    comment_rows = connection.execute(
+        select(Comment.issue_id, Comment.author, Comment.body, Comment.created_at)
+        .where(Comment.issue_id.in_(issue_ids))
+        .order_by(Comment.issue_id, Comment.created_at)
+    )
+    comments = {
+        issue_id: [
+            {'author': author, 'body': body, 'created_at': created_at}
+            for _, author, body, created_at in group
+        ]
+        for issue_id, group in groupby(comment_rows, key=lambda row: row[0])
+    }
+    arrays.append(pa.array(
+        [comments.get(issue_id, []) for issue_id in issue_ids],
+        type=schema.field('comments').type
+    ))
+
+    return pa.record_batch(arrays, schema=schema)
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,212 @@
+"""
+Near-duplicate detection for created and imported issues.
+
+An issue's title and description are reduced to the set of adjacent word
+pairs they contain (its shingles), each kept as a 64-bit hash. Two issues
+are likely duplicates when at least SIMILARITY of their combined shingles
+are shared (Jaccard similarity).
+
+Comparing a new issue with every stored one would be a table scan, so each
+issue also gets a MinHash signature of its shingles, cut into BANDS bands
+of ROWS values, and each band is hashed into a bucket kept in the indexed
+issue_bucket table. Similar issues almost always share a bucket: with 6
+bands of 3, a pair at 0.8 similarity does 98.6% of the time, and exact
+copies always do. Finding a new issue's candidates is then one indexed
+lookup of its buckets however many issues there are, and only those few
+candidates are compared shingle by shingle.
+
+Signatures have to be cheap, as every imported row gets one. Each distinct
+word is hashed once (and cached), a shingle's hash is combined from its two
+words' with integer arithmetic, and the signature is a one-permutation
+MinHash: a shingle's hash picks one of the BANDS * ROWS values by its
+remainder, and each value is the smallest hash it is picked by. That is one
+pass over the shingles instead of one per signature value.
+
+The buckets are written with each issue by its create, edit, import and
+delete; `flask --app app dedup` rebuilds them for existing data and lists
+(or archives) the duplicates already there. Run it again after upgrading
+from a release that computed buckets differently.
+"""
+import hashlib
+import re
+from functools import lru_cache
+from operator import xor
+from sqlalchemy import delete, insert, select
+from models import db, Issue, IssueBucket
+from sharding import read_issues
+
+BANDS = 6
+ROWS = 3
+SIMILARITY = 0.8
+
+# Most values per IN (...) lookup, well under SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+_BINS = BANDS * ROWS
+_MASK = (1 << 64) - 1
+# Odd, so multiplying by it mixes a hash without losing any of it
+_PAIR_MULTIPLIER = 0x9E3779B97F4A7C15
+# Above any 64-bit hash, so a value borrowed by an empty bin never equals a real one
+_BORROWED = 1 << 64
+
+_WORD = re.compile(r'\w+')
+
+@lru_cache(maxsize=1 << 16)
+def _word_hash(word):
+    """A word's 64-bit hash, and the same mixed for use as the first word of a pair"""
+    # A keyless hash, so every process computes the same buckets
+    value = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), 'big')
+    return value, (value * _PAIR_MULTIPLIER) & _MASK
+
+def shingles(title, description):
+    """The set of hashes of adjacent word pairs (or of the single word) in an issue's text"""
+    hashes = [_word_hash(word) for word in _WORD.findall(f'{title} {description or ""}'.lower())]
+    if len(hashes) < 2:
+        return frozenset(value for value, _ in hashes)
+    values, firsts = zip(*hashes)
+    return frozenset(map(xor, firsts, values[1:]))
+
+def similarity(first, second):
+    """Jaccard similarity of two shingle sets"""
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+def buckets(issue_shingles):
+    """The LSH bucket of each band of the shingles' MinHash signature"""
+    if not issue_shingles:
+        return []
+    # Written largest first, so each value ends up with the smallest hash picking it
+    picked = {shingle % _BINS: shingle for shingle in sorted(issue_shingles, reverse=True)}
+    signature = [picked.get(slot) for slot in range(_BINS)]
+    # A short text leaves values unpicked: each borrows the next picked one, offset by the distance
+    for slot in range(_BINS):
+        if signature[slot] is None:
+            distance = next(step for step in range(1, _BINS) if (slot + step) % _BINS in picked)
+            signature[slot] = distance * _BORROWED + picked[(slot + distance) % _BINS]
+    return [_bucket(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+def _bucket(band, values):
+    # Combined like a shingle's word hashes, then made a signed 64-bit integer for the column
+    bucket = band
+    for value in values:
+        bucket = (bucket * _PAIR_MULTIPLIER + value) & _MASK
+    return bucket - (1 << 64) if bucket >= 1 << 63 else bucket
+
+class SeenIssues:
+    """Issues held in memory by bucket, to find duplicates among issues not stored yet"""
+
+    def __init__(self):
+        self._by_bucket = {}
+
+    def match(self, issue_shingles, issue_buckets):
+        """The key of a seen issue the given one likely duplicates, or None"""
+        for bucket in issue_buckets:
+            for key, other in self._by_bucket.get(bucket, ()):
+                if similarity(issue_shingles, other) >= SIMILARITY:
+                    return key
+        return None
+
+    def add(self, key, issue_shingles, issue_buckets):
+        for bucket in issue_buckets:
+            self._by_bucket.setdefault(bucket, []).append((key, issue_shingles))
+
+def likely_duplicate(title, description):
+    """A stored issue (id, title) the given text likely duplicates, or None"""
+    issue_shingles = shingles(title, description)
+    match, = _stored_matches([(issue_shingles, buckets(issue_shingles))])
+    if match is None:
+        return None
+    return read_issues(select(Issue.id, Issue.title).where(Issue.id == match))[0]
+
+def skip_duplicates(issues):
+    """Drop the likely duplicates from a list of new issue dicts.
+
+    Issues are compared with the stored ones and with the earlier issues in
+    the list. Returns the issues to insert, each one's buckets (for
+    store_buckets() once they have ids) and how many were dropped.
+    """
+    signatures = []
+    for issue in issues:
+        issue_shingles = shingles(issue['title'], issue.get('description'))
+        signatures.append((issue_shingles, buckets(issue_shingles)))
+
+    kept, kept_buckets, seen = [], [], SeenIssues()
+    for issue, (issue_shingles, issue_buckets), match in zip(issues, signatures, _stored_matches(signatures)):
+        if match is not None or seen.match(issue_shingles, issue_buckets) is not None:
+            continue
+        seen.add(len(kept), issue_shingles, issue_buckets)
+        kept.append(issue)
+        kept_buckets.append(issue_buckets)
+    return kept, kept_buckets, len(issues) - len(kept)
+
+def _stored_matches(signatures):
+    """For each (shingles, buckets), the id of a stored issue it likely duplicates, or None"""
+    wanted = sorted({bucket for _, issue_buckets in signatures for bucket in issue_buckets})
+    candidates = {}
+    for chunk in _chunks(wanted):
+        for bucket, issue_id in db.session.execute(
+                select(IssueBucket.bucket, IssueBucket.issue_id).where(IssueBucket.bucket.in_(chunk))):
+            candidates.setdefault(bucket, []).append(issue_id)
+    if not candidates:
+        return [None] * len(signatures)
+
+    stored = {}
+    for chunk in _chunks(sorted({issue_id for ids in candidates.values() for issue_id in ids})):
+        for issue in read_issues(select(Issue.id, Issue.title, Issue.description).where(Issue.id.in_(chunk))):
+            stored[issue.id] = shingles(issue.title, issue.description)
+
+    matches = []
+    for issue_shingles, issue_buckets in signatures:
+        ids = sorted({issue_id for bucket in issue_buckets for issue_id in candidates.get(bucket, ())})
+        matches.append(next((issue_id for issue_id in ids if issue_id in stored
+                             and similarity(issue_shingles, stored[issue_id]) >= SIMILARITY), None))
+    return matches
+
+def store_buckets(issue_buckets):
+    """Store (issue id, buckets) pairs. Caller commits."""
+    rows = [{'bucket': bucket, 'issue_id': issue_id}
+            for issue_id, bucket_list in issue_buckets for bucket in bucket_list]
+    if rows:
+        # Through the table rather than the ORM, which would be most of an import's time here
+        db.session.execute(insert(IssueBucket.__table__), rows)
+
+def index_issues(issues):
+    """Store the buckets of new (id, title, description) issues. Caller commits."""
+    store_buckets((issue_id, buckets(shingles(title, description))) for issue_id, title, description in issues)
+
+def reindex_issue(issue_id, title, description):
+    """Replace an edited issue's buckets. Caller commits."""
+    forget_buckets([issue_id])
+    index_issues([(issue_id, title, description)])
+
+def forget_buckets(issue_ids):
+    """Remove deleted issues' buckets. Caller commits."""
+    for chunk in _chunks(list(issue_ids)):
+        db.session.execute(delete(IssueBucket).where(IssueBucket.issue_id.in_(chunk)))
+
+def rebuild_index():
+    """Recompute every issue's buckets, oldest first, and find the duplicates among them.
+
+    Returns {issue id: id of the older issue it likely duplicates}. Caller commits.
+    """
+    issues = read_issues(select(Issue.id, Issue.title, Issue.description).order_by(Issue.id),
+                         order_by=(Issue.id,))
+    duplicates, all_buckets, seen = {}, [], SeenIssues()
+    for issue_id, title, description in issues:
+        issue_shingles = shingles(title, description)
+        issue_buckets = buckets(issue_shingles)
+        all_buckets.append((issue_id, issue_buckets))
+        original = seen.match(issue_shingles, issue_buckets)
+        if original is None:
+            seen.add(issue_id, issue_shingles, issue_buckets)
+        else:
+            duplicates[issue_id] = original
+
+    forget_buckets(issue_id for issue_id, _ in all_buckets)
+    store_buckets(all_buckets)
+    return duplicates
+
+def _chunks(values):
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        yield values[start:start + LOOKUP_CHUNK]
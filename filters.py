@@ -0,0 +1,92 @@
+"""
+Listing filter compiler.
+
+The board, the archive and the exports all filter issues by the same
+status/owner/organization/due/q parameters. Each view's SELECT is built once per
+combination of active filters, with the filter values as bound parameters,
+and cached; a request only looks up its statement and supplies the values,
+so SQLAlchemy's compiled-statement cache is hit instead of a new query being
+assembled every time.
+"""
+from datetime import date, timedelta
+from functools import lru_cache
+from sqlalchemy import bindparam, select
+from models import Issue, Organization
+from backends import search_filter, search_pattern
+from projections import ROW_COLUMNS
+
+FILTER_NAMES = ('status', 'owner', 'organization', 'due', 'q')
+
+# 'Due soon' is today and the days after it, up to this many days in all
+DUE_SOON_DAYS = 7
+
+CONDITIONS = {
+    'status': Issue.status == bindparam('status'),
+    'owner': Issue.owner == bindparam('owner'),
+    'organization': Issue.organization_id == bindparam('organization'),
+    # On the board, served by the partial index on open issues' target_date
+    'due': Issue.target_date.between(bindparam('due_from'), bindparam('due_to')),
+    'q': search_filter(bindparam('q')),
+}
+
+# view name -> (columns, archived scope or None for all issues, ascending ordering)
+VIEWS = {
+    # Manual display_order first, then oldest first = most important
+    'board': (ROW_COLUMNS, False, (Issue.display_order, Issue.date_reported)),
+    'archive': (ROW_COLUMNS, True, (Issue.date_reported,)),
+    'export_csv': (
+        (Issue.title, Issue.description, Organization.name, Issue.status, Issue.date_reported,
+         Issue.reporter, Issue.owner, Issue.importance, Issue.target_date),
+        None, (Issue.date_reported,)
+    ),
+    # In columnar.ISSUE_FIELDS order
+    'export_columnar': (
+        (Issue.id, Issue.title, Issue.description, Organization.name, Issue.status, Issue.importance,
+         Issue.reporter, Issue.owner, Issue.date_reported, Issue.target_date, Issue.display_order,
+         Issue.archived, Issue.created_at, Issue.updated_at),
+        None, (Issue.date_reported,)
+    ),
+}
+
+def current_filters(args):
+    """The filter values from request args, '' for the ones not set"""
+    return {name: args.get(name, '') for name in FILTER_NAMES}
+
+def listing_statement(view, filters):
+    """Return (statement, params) selecting ``view``'s issues that match ``filters``"""
+    active = frozenset(name for name in FILTER_NAMES if filters.get(name))
+    params = {name: filters[name] for name in active}
+    if 'q' in params:
+        params['q'] = search_pattern(params['q'])
+    if 'due' in params:
+        window = due_window(params.pop('due'))
+        if window is None:
+            active -= {'due'}
+        else:
+            params['due_from'], params['due_to'] = window
+    return compile_listing(view, active), params
+
+def due_window(due, today=None):
+    """The (first, last) target dates matching the 'overdue' or 'soon' due filter, else None"""
+    today = today or date.today()
+    if due == 'overdue':
+        return date.min, today - timedelta(days=1)
+    if due == 'soon':
+        return today, today + timedelta(days=DUE_SOON_DAYS - 1)
+    return None
+
+def listing_order(view):
+    """The columns ``view``'s statements are ordered by, ascending"""
+    return VIEWS[view][2]
+
+@lru_cache(maxsize=None)  # bounded: len(VIEWS) * 2 ** len(FILTER_NAMES) entries
+def compile_listing(view, active):
+    columns, archived, order_by = VIEWS[view]
+    stmt = select(*columns).select_from(Issue).outerjoin(
+        Organization, Issue.organization_id == Organization.id)
+    if archived is not None:
+        stmt = stmt.where(Issue.archived == archived)
+    for name in FILTER_NAMES:
+        if name in active:
+            stmt = stmt.where(CONDITIONS[name])
+    return stmt.order_by(*[column.asc() for column in order_by])
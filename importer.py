@@ -0,0 +1,182 @@
+"""
+Batched CSV import.
+
+Rows are read in batches of BATCH_SIZE and transposed into columns, so each
+step works on a whole column at once: dates are parsed once per distinct
+value, status/importance are checked with set lookups, and organisation
+names are resolved with one query per batch. Rows that fail validation are
+skipped and reported instead of aborting the import, and rows that look like
+duplicates of existing issues (or of earlier rows) are skipped and counted,
+so importing the same file twice doesn't double the board.
+"""
+import csv
+from datetime import date, datetime
+from itertools import compress, islice, zip_longest
+from sqlalchemy import insert, select
+from models import db, Organization
+from sharding import insert_issues
+from duplicates import index_issues, skip_duplicates, store_buckets
+
+BATCH_SIZE = 5000
+
+VALID_STATUSES = frozenset(['Open', 'In Progress', 'Completed', 'Pending Info'])
+VALID_IMPORTANCE = frozenset(['High', 'Medium', 'Low'])
+
+# Accepted header names for each field; the first is what export.csv writes
+COLUMN_ALIASES = {
+    'title': ('Title',),
+    'description': ('Description',),
+    'organisation': ('Organisation', 'Organization'),
+    'status': ('Status',),
+    'date_reported': ('Date Reported',),
+    'reporter': ('Reported By', 'Reporter'),
+    'owner': ('Owner',),
+    'importance': ('Importance',),
+    'target_date': ('Target Date',),
+}
+
+class CSVImportError(Exception):
+    """The file as a whole can't be imported"""
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.errors = []  # (row number, column, message)
+
+    def add_error(self, row_number, column, message):
+        self.errors.append((row_number, column, message))
+
+def import_issues(text_stream, batch_size=BATCH_SIZE, allow_duplicates=False):
+    """Import issues from a CSV text stream. Caller commits."""
+    result = ImportResult()
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if not header:
+        raise CSVImportError('The file is empty')
+
+    positions = _column_positions(header)
+    if 'title' not in positions:
+        raise CSVImportError('The file has no Title column')
+
+    organization_ids = {}
+    first_row = 2  # row 1 is the header
+    while True:
+        rows = list(islice(reader, batch_size))
+        if not rows:
+            break
+        _import_batch(rows, first_row, positions, organization_ids, result, allow_duplicates)
+        first_row += len(rows)
+
+    return result
+
+def _column_positions(header):
+    stripped = [name.strip() for name in header]
+    positions = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in stripped:
+                positions[field] = stripped.index(alias)
+                break
+    return positions
+
+def _import_batch(rows, first_row, positions, organization_ids, result, allow_duplicates):
+    # Transpose into columns; short rows are padded with empty strings
+    width = max(positions.values()) + 1
+    all_columns = list(zip_longest(*rows, fillvalue=''))
+    all_columns += [('',) * len(rows)] * (width - len(all_columns))
+    columns = {
+        field: list(all_columns[index]) if field == 'description'
+        else [value.strip() for value in all_columns[index]]
+        for field, index in positions.items()
+    }
+    empty = [''] * len(rows)
+    valid = [True] * len(rows)
+
+    def reject(index, column, message):
+        valid[index] = False
+        result.add_error(first_row + index, column, message)
+
+    titles = columns['title']
+    for index in _indexes_of(titles, ''):
+        reject(index, 'Title', 'Title is required')
+
+    statuses = [value or 'Open' for value in columns.get('status', empty)]
+    _check_allowed(statuses, VALID_STATUSES, 'Status', reject)
+
+    importance = [value or 'Medium' for value in columns.get('importance', empty)]
+    _check_allowed(importance, VALID_IMPORTANCE, 'Importance', reject)
+
+    dates_reported = _parse_dates(columns.get('date_reported', empty), 'Date Reported', reject)
+    today = date.today()
+    dates_reported = [value or today for value in dates_reported]
+    target_dates = _parse_dates(columns.get('target_date', empty), 'Target Date', reject)
+
+    organisation_names = columns.get('organisation', empty)
+    _resolve_organizations(set(compress(organisation_names, valid)) - {''}, organization_ids)
+    organisation_ids = [organization_ids.get(name) for name in organisation_names]
+
+    fields = ['title', 'description', 'reporter', 'owner', 'organization_id', 'status',
+              'importance', 'date_reported', 'target_date']
+    values = zip(
+        titles,
+        columns.get('description', empty),
+        columns.get('reporter', empty),
+        [value or None for value in columns.get('owner', empty)],
+        organisation_ids,
+        statuses,
+        importance,
+        dates_reported,
+        target_dates,
+    )
+    issues = [dict(zip(fields, row)) for row in compress(values, valid)]
+
+    if allow_duplicates:
+        issue_buckets = None
+    else:
+        issues, issue_buckets, skipped = skip_duplicates(issues)
+        result.duplicates += skipped
+    insert_issues(issues)
+    if issue_buckets is None:
+        index_issues((issue['id'], issue['title'], issue['description']) for issue in issues)
+    else:
+        store_buckets(zip((issue['id'] for issue in issues), issue_buckets))
+    result.imported += len(issues)
+
+def _indexes_of(values, target):
+    return [index for index, value in enumerate(values) if value == target]
+
+def _check_allowed(values, allowed, column, reject):
+    for value in set(values) - allowed:
+        for index in _indexes_of(values, value):
+            reject(index, column, f"'{value}' is not one of {', '.join(sorted(allowed))}")
+
+def _parse_dates(values, column, reject):
+    """Parse a column of YYYY-MM-DD strings, once per distinct value"""
+    parsed = {'': None}
+    for value in set(values) - {''}:
+        try:
+            parsed[value] = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            parsed[value] = None
+            for index in _indexes_of(values, value):
+                reject(index, column, f"'{value}' is not a YYYY-MM-DD date")
+    return [parsed[value] for value in values]
+
+def _resolve_organizations(names, organization_ids):
+    """Fill organization_ids for every name, creating missing organisations in bulk"""
+    missing = names - organization_ids.keys()
+    if not missing:
+        return
+
+    existing = db.session.execute(
+        select(Organization.name, Organization.id).where(Organization.name.in_(missing))
+    ).all()
+    organization_ids.update(existing)
+
+    to_create = sorted(missing - organization_ids.keys())
+    if to_create:
+        db.session.execute(insert(Organization), [{'name': name} for name in to_create])
+        organization_ids.update(db.session.execute(
+            select(Organization.name, Organization.id).where(Organization.name.in_(to_create))
+        ).all())
@@ -0,0 +1,314 @@
+"""
+Concurrent load test for SQLite write contention.
+
+    python loadtest.py --viewers 20 --editors 5 --duration 30 \\
+        --server werkzeug,gunicorn-sync,gunicorn-threads --sqlite default,wal
+
+Seeds a throwaway SQLite database, then for every combination of serving
+and SQLite configuration starts the app as a real server process on a fresh
+copy of it and runs:
+
+- viewers, each polling the board (GET /) every --poll-interval seconds
+- editors, each making an issue edit, a comment or a drag-and-drop reorder
+  every --think-time seconds
+
+It prints throughput, latency percentiles, server-side lock-wait time and
+error rate per request type. Lock wait is the commit time the server
+reports in its Server-Timing header (SERVER_TIMING=1): on SQLite a commit
+includes waiting for the single write lock, and with WRITE_COALESCING it is
+the wait for the write's batch to commit. Errors are non-2xx responses
+(``database is locked`` surfaces as a 500) and failed connections.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'loadtest'
+
+# Command line after `python`; {port} is filled in per run
+SERVERS = {
+    'werkzeug': ['-m', 'flask', '--app', 'app', 'run', '--port', '{port}', '--with-threads', '--no-reload'],
+    'gunicorn-sync': ['-m', 'gunicorn', '--bind', '127.0.0.1:{port}', '--workers', '4', 'app:create_app()'],
+    'gunicorn-threads': ['-m', 'gunicorn', '--bind', '127.0.0.1:{port}', '--workers', '2', '--threads', '8',
+                         'app:create_app()'],
+}
+
+# Server environment for each configuration
+SQLITE_CONFIGS = {
+    'default': {},
+    'wal': {'SQLITE_PRAGMAS': 'journal_mode=wal'},
+    'wal-normal-sync': {'SQLITE_PRAGMAS': 'journal_mode=wal,synchronous=normal'},
+    'wal-coalesced': {'SQLITE_PRAGMAS': 'journal_mode=wal', 'WRITE_COALESCING': '1'},
+}
+
+STATUSES = ['Open', 'In Progress', 'Pending Info']
+OWNERS = ['Alice', 'Bob', 'Carol', 'Dave', None]
+
+def seed_database(path, issue_count):
+    """Create a database at ``path`` with the schema and ``issue_count`` issues"""
+    from app import create_app, init_db
+    from backends import bulk_insert_issues
+    from models import db, Organization
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TEMPLATE_WARMUP': False})
+    with app.app_context():
+        init_db()
+        db.session.add_all([Organization(name=f'Organisation {number}') for number in range(1, 6)])
+        db.session.flush()
+        organization_ids = [organization.id for organization in Organization.query.all()]
+        today = date.today()
+        bulk_insert_issues([
+            {
+                'title': f'Load test issue {number}',
+                'description': 'Seeded by loadtest.py. ' * 10,
+                'reporter': 'Load Tester',
+                'owner': random.choice(OWNERS),
+                'organization_id': random.choice(organization_ids),
+                'status': random.choice(STATUSES),
+                'importance': random.choice(['High', 'Medium', 'Low']),
+                'date_reported': today - timedelta(days=random.randrange(365)),
+                'display_order': number,
+            }
+            for number in range(issue_count)
+        ])
+        db.session.commit()
+        db.engine.dispose()
+
+class Results:
+    """Samples per request type: (latency ms, lock wait ms or None, error)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, kind, latency, lock_wait, error):
+        with self._lock:
+            self.samples[kind].append((latency, lock_wait, error))
+
+class Client:
+    """One keep-alive HTTP connection sharing the logged-in session cookie"""
+
+    def __init__(self, port, cookie, results):
+        self.port = port
+        self.cookie = cookie
+        self.results = results
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+
+    def request(self, kind, method, path, data=None):
+        headers = {'Cookie': self.cookie}
+        body = None
+        if data is not None:
+            headers['Content-Type'] = 'application/json'
+            body = json.dumps(data)
+
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+            self.results.add(kind, (time.perf_counter() - started) * 1000, None, True)
+            return
+        latency = (time.perf_counter() - started) * 1000
+        self.results.add(kind, latency, _commit_time(response.getheader('Server-Timing')),
+                         not 200 <= response.status < 300)
+
+def _commit_time(header):
+    for part in (header or '').split(','):
+        name, _, duration = part.strip().partition(';dur=')
+        if name == 'commit' and duration:
+            return float(duration)
+    return None
+
+def viewer(client, stop, poll_interval):
+    while not stop.is_set():
+        client.request('view board', 'GET', '/')
+        stop.wait(poll_interval)
+
+def editor(client, stop, think_time, issue_ids):
+    while not stop.is_set():
+        action = random.choices(['edit', 'comment', 'reorder'], weights=[5, 4, 1])[0]
+        issue_id = random.choice(issue_ids)
+        if action == 'edit':
+            client.request('edit issue', 'POST', f'/issues/{issue_id}', {
+                'status': random.choice(STATUSES),
+                'owner': random.choice(OWNERS),
+            })
+        elif action == 'comment':
+            client.request('comment', 'POST', f'/issues/{issue_id}/comment', {
+                'author': 'Load Tester',
+                'body': 'Still seeing this during the incident.',
+            })
+        else:
+            # Drag one row to a new position, sending the whole board's order
+            order = list(issue_ids)
+            order.insert(random.randrange(len(order)), order.pop(random.randrange(len(order))))
+            client.request('reorder', 'POST', '/issues/reorder', {'issue_ids': order})
+        stop.wait(think_time)
+
+def run(server, sqlite_config, seed_path, viewers, editors, duration, poll_interval, think_time):
+    """Serve a copy of the seeded database with one configuration and load it"""
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    try:
+        db_path = os.path.join(workdir, 'db.sqlite3')
+        shutil.copy(seed_path, db_path)
+        connection = sqlite3.connect(db_path)
+        try:
+            issue_ids = [row[0] for row in connection.execute(
+                'SELECT id FROM issue WHERE archived = 0 ORDER BY display_order')]
+        finally:
+            connection.close()
+
+        port = _free_port()
+        env = {
+            **os.environ,
+            'DATABASE_URL': f'sqlite:///{db_path}',
+            'SQLITE_PRAGMAS': '',
+            'WRITE_COALESCING': '',
+            'SERVER_TIMING': '1',
+            'APP_PASSWORD': PASSWORD,
+            'SECRET_KEY': 'loadtest',
+            **SQLITE_CONFIGS[sqlite_config],
+        }
+        with open(os.path.join(workdir, 'server.log'), 'wb') as log:
+            process = subprocess.Popen(
+                [sys.executable] + [arg.format(port=port) for arg in SERVERS[server]],
+                cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+            )
+            try:
+                cookie = _wait_and_login(port, process, workdir)
+                results = Results()
+                stop = threading.Event()
+                threads = [
+                    threading.Thread(target=viewer, args=(Client(port, cookie, results), stop, poll_interval))
+                    for _ in range(viewers)
+                ] + [
+                    threading.Thread(target=editor, args=(Client(port, cookie, results), stop, think_time, issue_ids))
+                    for _ in range(editors)
+                ]
+                for thread in threads:
+                    thread.start()
+                time.sleep(duration)
+                stop.set()
+                for thread in threads:
+                    thread.join()
+                return results
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _wait_and_login(port, process, workdir, timeout=30):
+    """Wait for the server to accept a login and return its session cookie"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            with open(os.path.join(workdir, 'server.log')) as log:
+                raise RuntimeError(f'Server exited with {process.returncode}:\n{log.read()}')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('POST', '/login', body=f'password={PASSWORD}',
+                               headers={'Content-Type': 'application/x-www-form-urlencoded'})
+            response = connection.getresponse()
+            response.read()
+            cookie = response.getheader('Set-Cookie')
+            connection.close()
+            if response.status == 302 and cookie:
+                return cookie.split(';', 1)[0]
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'Server did not start within {timeout}s')
+
+def summarize(results, duration):
+    """One row of stats per request type"""
+    rows = []
+    for kind, samples in sorted(results.samples.items()):
+        latencies = sorted(latency for latency, _, _ in samples)
+        lock_waits = sorted(wait for _, wait, _ in samples if wait is not None)
+        errors = sum(1 for _, _, error in samples if error)
+        rows.append({
+            'request': kind,
+            'count': len(samples),
+            'per_second': len(samples) / duration,
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'max': latencies[-1],
+            'lock_wait_p95': _percentile(lock_waits, 95) if lock_waits else None,
+            'error_rate': errors / len(samples),
+        })
+    return rows
+
+def _percentile(sorted_values, percent):
+    index = min(len(sorted_values) - 1, int(round(percent / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def print_report(server, sqlite_config, rows):
+    print(f'\n{server} / sqlite {sqlite_config}')
+    print(f"{'request':<12} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'lock p95':>9} {'errors':>7}")
+    for row in rows:
+        lock_wait = '-' if row['lock_wait_p95'] is None else f"{row['lock_wait_p95']:.1f}"
+        print(f"{row['request']:<12} {row['count']:>7} {row['per_second']:>8.1f} {row['p50']:>8.1f} "
+              f"{row['p95']:>8.1f} {row['p99']:>8.1f} {row['max']:>8.1f} {lock_wait:>9} "
+              f"{row['error_rate']:>7.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--viewers', type=int, default=20, help='clients polling the board')
+    parser.add_argument('--editors', type=int, default=5, help='clients making changes')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per configuration')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='seconds between board polls')
+    parser.add_argument('--think-time', type=float, default=0.2, help='seconds between an editor\'s changes')
+    parser.add_argument('--issues', type=int, default=500, help='issues to seed')
+    parser.add_argument('--server', default='werkzeug', help=f"comma-separated: {', '.join(SERVERS)}")
+    parser.add_argument('--sqlite', default='default', help=f"comma-separated: {', '.join(SQLITE_CONFIGS)}")
+    args = parser.parse_args()
+
+    servers = args.server.split(',')
+    sqlite_configs = args.sqlite.split(',')
+    for name in servers:
+        if name not in SERVERS:
+            parser.error(f'unknown server {name!r}')
+    for name in sqlite_configs:
+        if name not in SQLITE_CONFIGS:
+            parser.error(f'unknown SQLite configuration {name!r}')
+
+    seed_dir = tempfile.mkdtemp(prefix='loadtest-seed-')
+    try:
+        seed_path = os.path.join(seed_dir, 'seed.sqlite3')
+        seed_database(seed_path, args.issues)
+        print(f'{args.viewers} viewers, {args.editors} editors, {args.duration:g}s per configuration, '
+              f'{args.issues} issues')
+        for server in servers:
+            for sqlite_config in sqlite_configs:
+                results = run(server, sqlite_config, seed_path, args.viewers, args.editors,
+                              args.duration, args.poll_interval, args.think_time)
+                print_report(server, sqlite_config, summarize(results, args.duration))
+    finally:
+        shutil.rmtree(seed_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, event, DDL
+from routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def _pg_trgm_available(ddl, target, bind, **kw):
+    """Search still works without pg_trgm, it just isn't index-backed"""
+    return bind.exec_driver_sql(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"
+    ).scalar() is not None
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -16,6 +23,9 @@ class Organization(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Shard files are named by organisation id, so SQLite must never hand a deleted one out again
+    __table_args__ = {'sqlite_autoincrement': True}
+
 class Issue(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -30,8 +40,51 @@ class Issue(db.Model):
     target_date = db.Column(db.Date)
     display_order = db.Column(db.Integer, default=0)  # For manual ordering
     archived = db.Column(db.Boolean, default=False)  # For archiving completed issues
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped by every edit
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Indexed for the SLA scanner, which reads the issues changed since its last pass
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    # Trigram indexes serve the ILIKE '%...%' search on PostgreSQL
+    __table_args__ = tuple(
+        db.Index(
+            f'ix_issue_{name}_trgm', name,
+            postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'}
+        ).ddl_if(dialect='postgresql', callable_=_pg_trgm_available)
+        for name in ('title', 'description', 'reporter')
+    ) + (
+        # Only open issues can be overdue, so the due filters and the SLA
+        # scanner read a small index that leaves the archive out
+        db.Index('ix_issue_open_target_date', 'target_date',
+                 sqlite_where=archived == False, postgresql_where=archived == False),
+    )
+
+def create_issue_indexes(bind):
+    """Create any of the issue table's indexes that are missing.
+
+    create_all() only builds indexes along with a new table, so this adds the
+    ones introduced after a database was created.
+    """
+    for index in Issue.__table__.indexes:
+        index.create(bind, checkfirst=True)
+
+class IssueShard(db.Model):
+    """Which organisation's shard holds each issue, when sharding is on (see sharding.py).
+
+    Inserting here is also what hands out issue ids, so they stay unique
+    across the shards.
+    """
+    issue_id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, index=True)
+
+class IssueBucket(db.Model):
+    """The LSH buckets of each issue's title and description (see duplicates.py).
+
+    Issues sharing a bucket are candidate near-duplicates, so the primary key
+    makes finding them one index lookup per bucket.
+    """
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    issue_id = db.Column(db.Integer, primary_key=True, autoincrement=False, index=True)
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -40,3 +93,9 @@ class Comment(db.Model):
     author = db.Column(db.String(100), nullable=False)
     body = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+event.listen(
+    db.metadata, 'before_create',
+    DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(
+        dialect='postgresql', callable_=_pg_trgm_available)
+)
@@ -0,0 +1,46 @@
+"""
+Read-only row projections for the listing views.
+
+The board and archive only display issues, so rather than loading full
+Issue instances (identity map, change tracking, relationship proxies and the
+whole description) they select just the columns the rows render, with the
+organisation name joined in and the description cut to a preview in SQL,
+into plain named tuples.
+"""
+from typing import NamedTuple, Optional
+from datetime import date
+from sqlalchemy import func
+from models import Issue, Organization
+
+# Longer descriptions are shown truncated on the board, ending in an ellipsis
+DESCRIPTION_PREVIEW_LENGTH = 280
+
+class IssueRow(NamedTuple):
+    id: int
+    title: str
+    description: Optional[str]
+    organization_name: Optional[str]
+    status: str
+    date_reported: Optional[date]
+    reporter: str
+    owner: Optional[str]
+    importance: str
+    target_date: Optional[date]
+
+# Columns to select for IssueRow, from issue outer-joined to organization.
+# One character past the preview is enough to tell whether it was cut.
+ROW_COLUMNS = (
+    Issue.id, Issue.title, func.substr(Issue.description, 1, DESCRIPTION_PREVIEW_LENGTH + 1),
+    Organization.name, Issue.status, Issue.date_reported, Issue.reporter, Issue.owner,
+    Issue.importance, Issue.target_date
+)
+
+def issue_rows(result):
+    """Turn the rows of a ROW_COLUMNS select into a list of IssueRow"""
+    return [IssueRow._make(_with_preview(row)) for row in result]
+
+def _with_preview(row):
+    description = row[2]
+    if description is not None and len(description) > DESCRIPTION_PREVIEW_LENGTH:
+        return row[:2] + (description[:DESCRIPTION_PREVIEW_LENGTH] + '…',) + row[3:]
+    return row
@@ -0,0 +1,124 @@
+"""
+Read-replica routing for db.session.
+
+Routes wrapped in @read_only send their queries to the replica engine
+(REPLICA_DATABASE_URL) when one is configured. Everything else, and any
+browser session that committed a write in the last REPLICA_STICKY_SECONDS,
+keeps using the primary so users always see their own changes.
+
+With per-organisation sharding on (sharding.py), Issue and Comment
+statements go to the shard the route picked instead.
+"""
+import os
+import sqlite3
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.pool import NullPool
+
+REPLICA_BIND = 'replica'
+
+# Tables that live in per-organisation shards when sharding.py is enabled
+SHARDS = 'shards'
+SHARDED_TABLES = frozenset(['issue', 'comment'])
+
+def init_replica(app):
+    """Create the replica engine if REPLICA_DATABASE_URL is configured.
+
+    It is kept out of SQLALCHEMY_BINDS on purpose: no models are bound to it
+    and create_all() must never run against it.
+    """
+    url = app.config.get('REPLICA_DATABASE_URL')
+    if not url:
+        return
+    options = {}
+    if url.startswith('sqlite'):
+        # A snapshotted SQLite replica is swapped in by renaming a new file over
+        # the old one, so don't pool connections that would keep reading the old file
+        options['poolclass'] = NullPool
+    app.extensions[REPLICA_BIND] = create_engine(url, **options)
+
+def replica_engine():
+    return current_app.extensions.get(REPLICA_BIND)
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and mapper is not None and SHARDS in current_app.extensions \
+                and inspect(mapper).local_table.name in SHARDED_TABLES:
+            return self._shard()
+        if bind is None and self.reads_from_replica():
+            return replica_engine()
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _shard(self):
+        shard = self.info.get('shard')
+        if shard is None:
+            # The primary's own issue table is empty, so this would silently find nothing
+            raise RuntimeError('Issue and comment statements need a shard: '
+                               'use sharding.use_shard() or sharding.read_issues()')
+        return shard
+
+    def reads_from_replica(self):
+        """Whether reads in this request currently go to the replica"""
+        if self._flushing or self.info.get('wrote'):
+            return False
+        if not has_request_context() or not g.get('read_only'):
+            return False
+        if replica_engine() is None:
+            return False
+        # Read-your-writes: stay on the primary until the replica has caught up
+        last_write = session.get('last_write')
+        sticky = current_app.config['REPLICA_STICKY_SECONDS']
+        return last_write is None or time.time() - last_write > sticky
+
+def read_only(f):
+    """Mark a view as safe to serve from the read replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.read_only = False
+    return decorated_function
+
+def snapshot_sqlite_replica(primary_path, replica_path):
+    """Copy a consistent snapshot of the primary over the replica file.
+
+    Uses the SQLite online backup API, so writers are not blocked for the
+    whole copy, then atomically renames the snapshot into place.
+    """
+    temp_path = f'{replica_path}.tmp'
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(temp_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    os.replace(temp_path, replica_path)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_flush_write(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+def remember_write():
+    """Keep this browser session on the primary for REPLICA_STICKY_SECONDS"""
+    if has_request_context():
+        session['last_write'] = time.time()
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    if db_session.info.pop('wrote', False):
+        remember_write()
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(db_session):
+    db_session.info.pop('wrote', None)
@@ -0,0 +1,362 @@
+"""
+Per-organisation SQLite shards, enabled with SHARDS_DIR.
+
+Each organisation's issues and comments live in their own SQLite file,
+SHARDS_DIR/organization-<id>.sqlite3, with issues that have no organisation
+in unassigned.sqlite3. One organisation's imports, exports and bursts of
+edits then only take its own file's write lock, so write throughput grows
+with the number of organisations. The primary keeps the organisations and
+the issue_shard directory, which hands out issue ids (keeping them unique
+across shards) and records which shard holds each issue. Every shard also
+has a copy of its organisation's row, so the listing statements join to it
+unchanged; use_shard() copies it in the first time the shard is used.
+
+- Routes working on one issue call use_issue_shard() (or use_shard() for a
+  new one); db.session then sends Issue and Comment statements to that shard.
+  While sharding is on, RoutingSession refuses to run them without one.
+- Reads across organisations go through read_issues(), which runs the
+  statement on every shard in parallel and merges the rows in ORDER BY
+  order. With sharding off it is just db.session.execute().
+
+SQLite only, and not combined with a read replica or WRITE_COALESCING.
+"""
+import glob
+import heapq
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import abort, current_app
+from sqlalchemy import MetaData, create_engine, delete, insert, inspect, select
+from sqlalchemy.schema import CreateTable
+from models import db, Comment, Issue, IssueShard, Organization, create_issue_indexes
+from backends import bulk_insert_issues, configure_sqlite, reorder_issues as reorder_issue_rows
+from routing import SHARDS
+
+# Most shards queried at once by a cross-organisation read
+FAN_OUT_WORKERS = 8
+
+SHARD_TABLES = [Organization.__table__, Issue.__table__, Comment.__table__]
+
+def init_shards(app):
+    directory = app.config.get('SHARDS_DIR')
+    if not directory:
+        return
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        raise ValueError('SHARDS_DIR needs a SQLite DATABASE_URL')
+    if app.config.get('REPLICA_DATABASE_URL') or app.config.get('WRITE_COALESCING'):
+        raise ValueError('SHARDS_DIR cannot be combined with REPLICA_DATABASE_URL or WRITE_COALESCING')
+    os.makedirs(directory, exist_ok=True)
+    app.extensions[SHARDS] = ShardSet(app, directory)
+
+def sharding_enabled():
+    return SHARDS in current_app.extensions
+
+class ShardSet:
+    """The shard files in one directory, with an engine per shard opened on first use"""
+
+    def __init__(self, app, directory):
+        self.app = app
+        self.directory = directory
+        self._engines = {}
+        self._with_organization = set()
+        self._lock = threading.Lock()
+
+    def path(self, organization_id):
+        name = 'unassigned' if organization_id is None else f'organization-{int(organization_id)}'
+        return os.path.join(self.directory, f'{name}.sqlite3')
+
+    def engine(self, organization_id, create=True):
+        """The engine for an organisation's shard, creating the shard if needed.
+
+        With ``create=False``, returns None for a shard that doesn't exist yet.
+        """
+        key = None if organization_id is None else int(organization_id)
+        path = self.path(key)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                if os.path.exists(path):
+                    return engine
+                # Another process dropped the shard; don't write to the unlinked file
+                del self._engines[key]
+                self._with_organization.discard(key)
+                engine.dispose()
+            if not create and not os.path.exists(path):
+                return None
+            engine = create_engine(f'sqlite:///{path}')
+            configure_sqlite(self.app, engine)
+            self._create_schema(engine)
+            self._engines[key] = engine
+            return engine
+
+    def engines(self):
+        """Engines for every shard that exists, including ones other processes created"""
+        keys = []
+        for path in glob.glob(os.path.join(self.directory, '*.sqlite3')):
+            match = re.fullmatch(r'organization-(\d+)|unassigned', os.path.basename(path)[:-len('.sqlite3')])
+            if match:
+                keys.append(int(match.group(1)) if match.group(1) else None)
+        return [self.engine(key) for key in keys]
+
+    def drop(self, organization_id):
+        """Delete an organisation's shard, which must have no issues left"""
+        with self._lock:
+            engine = self._engines.pop(int(organization_id), None)
+            self._with_organization.discard(int(organization_id))
+            if engine is not None:
+                engine.dispose()
+            path = self.path(organization_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _create_schema(self, engine):
+        # Idempotent, as another worker process may be creating the same shard
+        db.metadata.create_all(engine, tables=SHARD_TABLES)
+        create_issue_indexes(engine)
+
+    def has_organization(self, organization_id):
+        """Whether the organisation's row is committed in its shard (remembered once it is)"""
+        key = int(organization_id)
+        if key in self._with_organization:
+            return True
+        with self.engine(key).connect() as connection:
+            found = connection.execute(select(Organization.id).where(Organization.id == key)).first()
+        if found is not None:
+            self._with_organization.add(key)
+        return found is not None
+
+def _shards():
+    return current_app.extensions[SHARDS]
+
+def use_shard(organization_id):
+    """Send this session's Issue and Comment statements to an organisation's shard"""
+    if not sharding_enabled():
+        return
+    engine = _shards().engine(organization_id)
+    db.session.info['shard'] = engine
+    if organization_id is not None and not _shards().has_organization(organization_id):
+        # In the session's transaction, so an organisation it has just added (say, by
+        # an import) is copied too, and the copy is rolled back along with it
+        _copy_organization(db.session, db.session.connection(bind_arguments={'bind': engine}), organization_id)
+
+def _copy_organization(source, target, organization_id):
+    """Copy an organisation's row from the primary (``source``) into its shard (``target``)"""
+    organization = source.execute(
+        select(Organization.id, Organization.name, Organization.created_at)
+        .where(Organization.id == organization_id)
+    ).mappings().first()
+    if organization is not None:
+        target.execute(insert(Organization).prefix_with('OR IGNORE').values(**organization))
+
+def use_issue_shard(issue_id):
+    """use_shard() for the shard holding an existing issue, or 404"""
+    if not sharding_enabled():
+        return
+    location = db.session.execute(
+        select(IssueShard.organization_id).where(IssueShard.issue_id == issue_id)
+    ).first()
+    if location is None:
+        abort(404)
+    use_shard(location.organization_id)
+
+def add_issue(issue):
+    """db.session.add() a new issue, into its organisation's shard.
+
+    With sharding on, the issue gets its id from the directory and is flushed
+    straight away, while its shard is the session's.
+    """
+    if not sharding_enabled():
+        db.session.add(issue)
+        return
+    issue.id = _allocate_issue_ids([issue.organization_id])[0]
+    use_shard(issue.organization_id)
+    db.session.add(issue)
+    db.session.flush()
+
+def insert_issues(rows):
+    """bulk_insert_issues(), split across the organisations' shards"""
+    if not sharding_enabled():
+        bulk_insert_issues(rows)
+        return
+    by_organization = {}
+    for row in rows:
+        by_organization.setdefault(row.get('organization_id'), []).append(row)
+    for organization_id, shard_rows in by_organization.items():
+        issue_ids = _allocate_issue_ids([organization_id] * len(shard_rows))
+        for row, issue_id in zip(shard_rows, issue_ids):
+            row['id'] = issue_id
+        use_shard(organization_id)
+        bulk_insert_issues(shard_rows)
+
+def _allocate_issue_ids(organization_ids):
+    return db.session.execute(
+        insert(IssueShard).returning(IssueShard.issue_id, sort_by_parameter_order=True),
+        [{'organization_id': organization_id} for organization_id in organization_ids]
+    ).scalars().all()
+
+def move_issue(issue_id, organization_id):
+    """Move an issue in the current shard, with its comments, to ``organization_id``'s shard.
+
+    Does nothing unless sharding is on and the issue is in another shard.
+    Leaves the session on the new shard.
+    """
+    if not sharding_enabled():
+        return
+    organization_id = int(organization_id) if organization_id else None
+    location = db.session.get(IssueShard, issue_id)
+    if location is None or location.organization_id == organization_id:
+        return
+
+    source = db.session.connection(bind_arguments={'mapper': inspect(Issue)})
+    issue = source.execute(select(Issue.__table__).where(Issue.id == issue_id)).mappings().one()
+    comments = source.execute(
+        select(*[column for column in Comment.__table__.c if column.key != 'id'])
+        .where(Comment.issue_id == issue_id)
+    ).mappings().all()
+    source.execute(delete(Comment.__table__).where(Comment.issue_id == issue_id))
+    source.execute(delete(Issue.__table__).where(Issue.id == issue_id))
+
+    # Comment ids are per shard, so the copies get new ones
+    target = db.session.connection(bind_arguments={'bind': _shards().engine(organization_id)})
+    target.execute(insert(Issue.__table__), [{**issue, 'organization_id': organization_id}])
+    if comments:
+        target.execute(insert(Comment.__table__), [dict(comment) for comment in comments])
+    location.organization_id = organization_id
+    use_shard(organization_id)
+
+def forget_issue(issue_id):
+    """Remove a deleted issue from the directory"""
+    if sharding_enabled():
+        db.session.execute(delete(IssueShard).where(IssueShard.issue_id == issue_id))
+
+def reorder_issues(issue_ids):
+    """backends.reorder_issues(), one UPDATE per shard the issues are in"""
+    if not sharding_enabled():
+        reorder_issue_rows(issue_ids)
+        return
+    issue_ids = [int(issue_id) for issue_id in issue_ids]
+    locations = dict(db.session.execute(
+        select(IssueShard.issue_id, IssueShard.organization_id).where(IssueShard.issue_id.in_(issue_ids))
+    ).all())
+    by_organization = {}
+    for position, issue_id in enumerate(issue_ids):
+        if issue_id in locations:
+            by_organization.setdefault(locations[issue_id], []).append((issue_id, position))
+    for organization_id, positions in by_organization.items():
+        use_shard(organization_id)
+        reorder_issue_rows(*zip(*positions))
+
+def drop_shard(organization_id):
+    """Delete a deleted organisation's (empty) shard"""
+    if sharding_enabled():
+        _shards().drop(organization_id)
+
+def read_issues(stmt, params=None, order_by=(), organization=None):
+    """Rows of a SELECT on issues, from every shard when sharding is on.
+
+    ``order_by`` repeats the statement's ORDER BY columns (all ascending),
+    which the per-shard results are merged on. ``organization`` restricts a
+    sharded read to that organisation's shard.
+    """
+    if not sharding_enabled():
+        return db.session.execute(stmt, params).all()
+
+    engines = _engines_for(organization)
+    if order_by:
+        stmt = stmt.add_columns(*order_by)
+
+    def run(engine):
+        with engine.connect() as connection:
+            return connection.execute(stmt, params).all()
+
+    with ThreadPoolExecutor(max_workers=min(FAN_OUT_WORKERS, len(engines) or 1)) as pool:
+        results = list(pool.map(run, engines))
+
+    if not order_by:
+        return [row for rows in results for row in rows]
+    width = len(order_by)
+    # NULLs first, as SQLite sorts them
+    merged = heapq.merge(*results, key=lambda row: tuple((value is not None, value) for value in row[-width:]))
+    return [row[:-width] for row in merged]
+
+def shard_connections(organization=None):
+    """Open a connection to every shard (or just ``organization``'s); the caller closes them"""
+    return [engine.connect() for engine in _engines_for(organization)]
+
+def _engines_for(organization):
+    if not organization:
+        return _shards().engines()
+    # ``organization`` comes from the query string; never create a shard for it
+    engine = _shards().engine(organization, create=False) if str(organization).isdigit() else None
+    return [engine] if engine is not None else []
+
+def use_unique_organization_ids():
+    """Rebuild an existing organisation table with AUTOINCREMENT, so deleted ids aren't reused.
+
+    Shard files are named by organisation id: a reused id would hand a new
+    organisation the shard (and other processes' cached engines) of a
+    deleted one. Returns whether the table was rebuilt.
+    """
+    create_sql = str(CreateTable(Organization.__table__.to_metadata(MetaData(), name='organization_new'))
+                     .compile(dialect=db.engine.dialect))
+    connection = db.engine.raw_connection()
+    try:
+        sqlite = connection.driver_connection
+        sql, = sqlite.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'organization'") \
+            .fetchone() or (None,)
+        if sql is None or 'AUTOINCREMENT' in sql.upper():
+            return False
+        # Outside any transaction, as PRAGMA foreign_keys is ignored inside one; dropping
+        # the old table mustn't touch the rows that refer to it
+        isolation_level, sqlite.isolation_level = sqlite.isolation_level, None
+        foreign_keys, = sqlite.execute('PRAGMA foreign_keys').fetchone()
+        sqlite.execute('PRAGMA foreign_keys = OFF')
+        try:
+            sqlite.execute('BEGIN')
+            sqlite.execute(create_sql)
+            sqlite.execute('INSERT INTO organization_new (id, name, created_at) '
+                           'SELECT id, name, created_at FROM organization')
+            sqlite.execute('DROP TABLE organization')
+            sqlite.execute('ALTER TABLE organization_new RENAME TO organization')
+            sqlite.execute('COMMIT')
+        except Exception:
+            sqlite.execute('ROLLBACK')
+            raise
+        finally:
+            sqlite.execute(f'PRAGMA foreign_keys = {int(foreign_keys)}')
+            sqlite.isolation_level = isolation_level
+        return True
+    finally:
+        connection.close()
+
+def move_primary_issues_to_shards():
+    """Move issues (and comments) stored in the primary, from before sharding was on, into shards"""
+    with db.engine.begin() as primary:
+        issues = primary.execute(select(Issue.__table__)).mappings().all()
+        if not issues:
+            return 0
+        comments = primary.execute(
+            select(*[column for column in Comment.__table__.c if column.key != 'id'])
+        ).mappings().all()
+        primary.execute(insert(IssueShard), [
+            {'issue_id': issue['id'], 'organization_id': issue['organization_id']} for issue in issues
+        ])
+
+        by_organization = {}
+        for issue in issues:
+            by_organization.setdefault(issue['organization_id'], []).append(issue)
+        organization_of = {issue['id']: issue['organization_id'] for issue in issues}
+        for organization_id, shard_issues in by_organization.items():
+            shard_comments = [comment for comment in comments
+                              if organization_of.get(comment['issue_id']) == organization_id]
+            with _shards().engine(organization_id).begin() as shard:
+                if organization_id is not None:
+                    _copy_organization(primary, shard, organization_id)
+                shard.execute(insert(Issue.__table__), [dict(issue) for issue in shard_issues])
+                if shard_comments:
+                    shard.execute(insert(Comment.__table__), [dict(comment) for comment in shard_comments])
+
+        primary.execute(delete(Comment.__table__))
+        primary.execute(delete(Issue.__table__))
+        return len(issues)
@@ -0,0 +1,124 @@
+"""
+Cross-worker cache for board snapshots and filter facets, enabled with
+SHARED_CACHE_PATH.
+
+Every worker process on the machine shares one SQLite file of pickled
+values, each stored under the global data version it was computed at. Any
+committed write bumps the version, so one write invalidates every worker's
+entries at once. Lookups only match the current version, and a value is only
+stored if the version hasn't moved on since it was read, so a snapshot
+computed while a write was landing is never served.
+
+If a write can't bump the version (say, the cache file is locked), that
+process bypasses the cache until a later bump gets through. At most
+MAX_ENTRIES entries are kept, the oldest being dropped first.
+
+Requests reading from the read replica skip the cache: the replica may lag
+behind the version, and a stale snapshot would then be shared with everyone.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from models import db
+from routing import RoutingSession
+
+SHARED_CACHE = 'shared_cache'
+
+# Most entries kept at one version; each free-text search adds one until the next write
+MAX_ENTRIES = 1000
+
+def init_shared_cache(app):
+    path = app.config.get('SHARED_CACHE_PATH')
+    if not path:
+        return
+    app.extensions[SHARED_CACHE] = SharedCache(path)
+    # Start from a fresh version, in case data changed while nothing was running
+    try:
+        app.extensions[SHARED_CACHE].bump()
+    except sqlite3.Error:
+        app.logger.exception('Shared cache invalidation failed')
+
+def cached(key, compute):
+    """The shared value for ``key`` at the current data version, computing it on a miss"""
+    store = current_app.extensions.get(SHARED_CACHE)
+    if store is None or db.session().reads_from_replica():
+        return compute()
+    return store.get_or_compute(key, compute)
+
+class SharedCache:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Set while a bump hasn't got through: entries may be stale, so they aren't used
+        self._bump_pending = False
+
+    def _connection(self):
+        # One connection per thread, and never one inherited across a fork
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=wal')
+            connection.execute('PRAGMA synchronous=normal')
+            connection.execute('CREATE TABLE IF NOT EXISTS data_version '
+                               '(id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO data_version VALUES (1, 0)')
+            connection.execute('CREATE TABLE IF NOT EXISTS entry '
+                               '(key TEXT PRIMARY KEY, version INTEGER NOT NULL, value BLOB NOT NULL)')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def version(self):
+        return self._connection().execute('SELECT version FROM data_version').fetchone()[0]
+
+    def bump(self):
+        """Invalidate every entry; if that fails, this process bypasses the cache until one succeeds"""
+        self._bump_pending = True
+        connection = self._connection()
+        connection.execute('UPDATE data_version SET version = version + 1')
+        # Entries from older versions can never be served again
+        connection.execute('DELETE FROM entry WHERE version < (SELECT version FROM data_version)')
+        self._bump_pending = False
+
+    def get_or_compute(self, key, compute):
+        try:
+            if self._bump_pending:
+                self.bump()
+            connection = self._connection()
+            version = self.version()
+            row = connection.execute('SELECT value FROM entry WHERE key = ? AND version = ?',
+                                     (key, version)).fetchone()
+        except sqlite3.Error:
+            current_app.logger.exception('Shared cache read failed')
+            return compute()
+        if row is not None:
+            return pickle.loads(row[0])
+
+        value = compute()
+        try:
+            connection.execute(
+                'INSERT INTO entry (key, version, value) SELECT ?, ?, ? '
+                'WHERE ? = (SELECT version FROM data_version) '
+                'ON CONFLICT (key) DO UPDATE SET version = excluded.version, value = excluded.value',
+                (key, version, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), version)
+            )
+            # Drop the oldest entries beyond MAX_ENTRIES
+            connection.execute('DELETE FROM entry WHERE rowid <= (SELECT max(rowid) FROM entry) - ?',
+                               (MAX_ENTRIES,))
+        except sqlite3.Error:
+            current_app.logger.exception('Shared cache write failed')
+        return value
+
+# insert=True: must run before routing's own after_commit listener clears the flag
+@event.listens_for(RoutingSession, 'after_commit', insert=True)
+def _bump_on_write(db_session):
+    if db_session.info.get('wrote') and has_app_context():
+        store = current_app.extensions.get(SHARED_CACHE)
+        if store is not None:
+            try:
+                store.bump()
+            except sqlite3.Error:
+                # The write itself has committed, so don't fail the request over the cache
+                current_app.logger.exception('Shared cache invalidation failed')
@@ -0,0 +1,127 @@
+"""
+Overdue counts for the board's SLA tiles, per owner and per organisation.
+
+Each worker process keeps the open issues that are overdue or due soon in
+memory and rescans at most every SLA_SCAN_SECONDS, on the first board
+request after the interval has passed (other requests meanwhile use the
+last counts rather than waiting). No scan reads the whole issue table: only
+the first one reads every open issue due within DUE_SOON_DAYS, from the
+partial index on open issues' target_date. After that, each scan reads:
+
+- the issues updated since the last scan (from the updated_at index), which
+  may have come onto or left the list, e.g. by being archived or given a
+  new target date;
+- when the date has rolled over, the open issues that have just come into
+  the due soon window;
+- a count of the open issues in the window, from the same partial index,
+  which only differs from the list's size after deletes; the window is then
+  read again.
+
+Writes to updated_at land before their commit does, so each scan reads back
+a margin of SCAN_OVERLAP before the previous one started. Issues seen twice
+are simply replaced.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, select
+from models import db, Issue, Organization
+from filters import DUE_SOON_DAYS
+from sharding import read_issues
+
+SLA = 'sla'
+
+# Longer than any write transaction takes to commit
+SCAN_OVERLAP = timedelta(minutes=1)
+
+OPEN_ISSUES = select(Issue.id, Issue.owner, Issue.organization_id, Issue.target_date) \
+    .where(Issue.archived == False, Issue.target_date.isnot(None))
+
+def init_sla(app):
+    app.extensions[SLA] = SLAScanner(app, app.config['SLA_SCAN_SECONDS'])
+
+def sla_summary():
+    """The latest SLA counts, scanning first if they are older than SLA_SCAN_SECONDS"""
+    return current_app.extensions[SLA].summary()
+
+class SLAScanner:
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._issues = None  # issue id -> (owner, organization_id, target_date)
+        self._today = None
+        self._since = None
+        self._summary = None
+        self._scanned = None
+
+    def summary(self):
+        due = self._summary is None or time.monotonic() - self._scanned >= self.interval
+        # Only one request per process scans; the others keep the last summary
+        if due and self._lock.acquire(blocking=self._summary is None):
+            try:
+                if self._summary is None or time.monotonic() - self._scanned >= self.interval:
+                    self.scan()
+            finally:
+                self._lock.release()
+        return self._summary
+
+    def scan(self, today=None):
+        """Bring the overdue and due soon issues up to date, and summarise them"""
+        # A session of its own, on the primary: the request's may be reading a lagging replica
+        with self.app.app_context():
+            self._scan(today or date.today())
+
+    def _scan(self, today):
+        started = datetime.utcnow()
+        horizon = today + timedelta(days=DUE_SOON_DAYS)
+
+        if self._issues is None:
+            self._issues = {}
+            self._track(read_issues(OPEN_ISSUES.where(Issue.target_date < horizon)))
+        else:
+            if today != self._today:
+                old_horizon = self._today + timedelta(days=DUE_SOON_DAYS)
+                self._track(read_issues(OPEN_ISSUES.where(Issue.target_date >= old_horizon,
+                                                          Issue.target_date < horizon)))
+            changed = read_issues(
+                select(Issue.id, Issue.owner, Issue.organization_id, Issue.target_date, Issue.archived)
+                .where(Issue.updated_at >= self._since - SCAN_OVERLAP)
+            )
+            for issue in changed:
+                self._issues.pop(issue.id, None)
+                if not issue.archived and issue.target_date is not None and issue.target_date < horizon:
+                    self._issues[issue.id] = (issue.owner, issue.organization_id, issue.target_date)
+            in_window = sum(count for count, in read_issues(
+                select(func.count()).where(Issue.archived == False, Issue.target_date < horizon)))
+            if in_window != len(self._issues):
+                # Something was deleted
+                self._issues = {}
+                self._track(read_issues(OPEN_ISSUES.where(Issue.target_date < horizon)))
+
+        self._today = today
+        self._since = started
+        self._summary = self._summarise(today)
+        self._scanned = time.monotonic()
+
+    def _track(self, rows):
+        for issue in rows:
+            self._issues[issue.id] = (issue.owner, issue.organization_id, issue.target_date)
+
+    def _summarise(self, today):
+        overdue = [(owner, organization_id) for owner, organization_id, target_date in self._issues.values()
+                   if target_date < today]
+        by_organization = Counter(organization_id for _, organization_id in overdue)
+        names = dict(db.session.execute(
+            select(Organization.id, Organization.name).where(Organization.id.in_(
+                [organization_id for organization_id in by_organization if organization_id is not None]))
+        ).all()) if by_organization else {}
+        return {
+            'overdue': len(overdue),
+            'due_soon': len(self._issues) - len(overdue),
+            'owners': Counter(owner for owner, _ in overdue).most_common(),
+            'organizations': [(names.get(organization_id), count)
+                              for organization_id, count in by_organization.most_common()],
+        }
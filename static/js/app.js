@@ -0,0 +1,20 @@
+// HTMX configuration
+// Parse responses in a <template> so table rows and out-of-band elements can share one response
+htmx.config.useTemplateFragments = true;
+
+document.body.addEventListener('htmx:configRequest', function(evt) {
+    evt.detail.headers['X-CSRFToken'] = document.querySelector('meta[name="csrf-token"]').content;
+});
+
+// Mutations answer failures with a JSON error, which HTMX doesn't swap in
+document.body.addEventListener('htmx:responseError', function(evt) {
+    let message = 'Request failed';
+    try {
+        message = JSON.parse(evt.detail.xhr.responseText).error || message;
+    } catch (e) {}
+    if (window.showRequestError) {
+        showRequestError(message);
+    } else {
+        alert(message);
+    }
+});
@@ -0,0 +1,22 @@
+function unarchiveIssue(issueId) {
+    if (confirm('Are you sure you want to restore this issue to the active list?')) {
+        htmx.ajax('POST', `/issues/${issueId}/unarchive`, {
+            target: `#issue-${issueId}`,
+            swap: 'outerHTML'
+        });
+    }
+}
+
+function openEditModal(issueId) {
+    // Redirect to main page with edit modal
+    window.location.href = `${document.body.dataset.indexUrl}?edit=${issueId}`;
+}
+
+function openDeleteModal(issueId, title) {
+    if (confirm(`Are you sure you want to delete "${title}"? This cannot be undone.`)) {
+        htmx.ajax('DELETE', `/issues/${issueId}`, {
+            target: `#issue-${issueId}`,
+            swap: 'outerHTML'
+        });
+    }
+}
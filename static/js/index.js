@@ -0,0 +1,283 @@
+let currentIssueId = null;
+
+function openCreateModal() {
+    document.getElementById('createModal').classList.remove('hidden');
+}
+
+function closeCreateModal() {
+    document.getElementById('createModal').classList.add('hidden');
+    document.getElementById('createForm').reset();
+}
+
+function openEditModal(issueId) {
+    currentIssueId = issueId;
+    // Load issue data via HTMX
+    htmx.ajax('GET', `/issues/${issueId}/edit`, {
+        target: '#editFormContent',
+        swap: 'innerHTML'
+    });
+    document.getElementById('editModal').classList.remove('hidden');
+}
+
+function closeEditModal() {
+    document.getElementById('editModal').classList.add('hidden');
+    currentIssueId = null;
+}
+
+function openCommentModal(issueId) {
+    currentIssueId = issueId;
+    document.getElementById('commentModal').classList.remove('hidden');
+}
+
+function closeCommentModal() {
+    document.getElementById('commentModal').classList.add('hidden');
+    document.getElementById('commentForm').reset();
+    currentIssueId = null;
+}
+
+function openDeleteModal(issueId, issueTitle) {
+    currentIssueId = issueId;
+    document.getElementById('deleteIssueTitle').textContent = issueTitle;
+    document.getElementById('deleteModal').classList.remove('hidden');
+}
+
+function closeDeleteModal() {
+    document.getElementById('deleteModal').classList.add('hidden');
+    currentIssueId = null;
+}
+
+function confirmDelete() {
+    if (currentIssueId) {
+        // The server answers with an empty row and out-of-band counter updates
+        htmx.ajax('DELETE', `/issues/${currentIssueId}`, {
+            target: `#issue-${currentIssueId}`,
+            swap: 'outerHTML'
+        }).then(closeDeleteModal);
+    }
+}
+
+function openAddOrganizationModal() {
+    document.getElementById('addOrganizationModal').classList.remove('hidden');
+}
+
+function closeAddOrganizationModal() {
+    document.getElementById('addOrganizationModal').classList.add('hidden');
+    document.getElementById('addOrganizationForm').reset();
+}
+
+// Form submissions swap in the server-rendered row instead of reloading the page
+const createForm = document.getElementById('createForm');
+createForm.addEventListener('submit', function(e) {
+    e.preventDefault();
+    htmx.ajax('POST', '/issues', {
+        source: this,
+        target: '#issuesTableBody',
+        swap: 'beforeend'
+    });
+});
+createForm.addEventListener('htmx:afterRequest', function(e) {
+    if (e.detail.successful) {
+        closeCreateModal();
+    }
+});
+
+const editForm = document.getElementById('editForm');
+editForm.addEventListener('submit', function(e) {
+    e.preventDefault();
+    htmx.ajax('POST', `/issues/${currentIssueId}`, {
+        source: this,
+        target: `#issue-${currentIssueId}`,
+        swap: 'outerHTML'
+    });
+});
+editForm.addEventListener('htmx:afterRequest', function(e) {
+    if (e.detail.successful) {
+        closeEditModal();
+    }
+});
+
+document.getElementById('commentForm').addEventListener('submit', function(e) {
+    e.preventDefault();
+    const formData = new FormData(this);
+    const data = Object.fromEntries(formData.entries());
+    
+    fetch(`/issues/${currentIssueId}/comment`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(data)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            closeCommentModal();
+            // Could refresh or show success message
+        }
+    });
+});
+
+// Add organisation form submission: the server sends back the create modal's
+// options with the new organisation selected, and the filter's out of band
+const addOrganizationForm = document.getElementById('addOrganizationForm');
+addOrganizationForm.addEventListener('submit', function(e) {
+    e.preventDefault();
+    htmx.ajax('POST', '/organizations', {
+        source: this,
+        target: '#organizationSelect',
+        swap: 'innerHTML'
+    });
+});
+addOrganizationForm.addEventListener('htmx:afterRequest', function(e) {
+    if (e.detail.successful) {
+        closeAddOrganizationModal();
+    }
+});
+
+// Close modals when clicking outside
+document.addEventListener('click', function(e) {
+    if (e.target.classList.contains('fixed')) {
+        closeCreateModal();
+        closeEditModal();
+        closeCommentModal();
+        closeDeleteModal();
+        closeAddOrganizationModal();
+    }
+});
+
+// Drag and Drop functionality
+let draggedElement = null;
+let draggedOverElement = null;
+
+// Runs for the initial page and again for every row swapped in later
+htmx.onLoad(function(content) {
+    // Add drag event listeners to all draggable rows
+    const draggableRows = content.matches('.draggable-row') ? [content] : content.querySelectorAll('.draggable-row');
+    draggableRows.forEach(row => {
+        row.addEventListener('dragstart', handleDragStart);
+        row.addEventListener('dragend', handleDragEnd);
+        row.addEventListener('dragover', handleDragOver);
+        row.addEventListener('drop', handleDrop);
+        row.addEventListener('dragenter', handleDragEnter);
+        row.addEventListener('dragleave', handleDragLeave);
+    });
+});
+
+function handleDragStart(e) {
+    draggedElement = this;
+    this.style.opacity = '0.5';
+    e.dataTransfer.effectAllowed = 'move';
+    e.dataTransfer.setData('text/html', this.outerHTML);
+}
+
+function handleDragEnd(e) {
+    this.style.opacity = '';
+    this.style.backgroundColor = '';
+    
+    // Remove all drag-over styling
+    const rows = document.querySelectorAll('.draggable-row');
+    rows.forEach(row => {
+        row.style.backgroundColor = '';
+        row.classList.remove('drag-over');
+    });
+}
+
+function handleDragOver(e) {
+    e.preventDefault();
+    e.dataTransfer.dropEffect = 'move';
+    return false;
+}
+
+function handleDragEnter(e) {
+    e.preventDefault();
+    if (this !== draggedElement) {
+        this.style.backgroundColor = '#f3f4f6';
+        this.classList.add('drag-over');
+    }
+}
+
+function handleDragLeave(e) {
+    if (this !== draggedElement) {
+        this.style.backgroundColor = '';
+        this.classList.remove('drag-over');
+    }
+}
+
+function handleDrop(e) {
+    e.preventDefault();
+    
+    if (this !== draggedElement) {
+        // Get the table body
+        const tableBody = document.getElementById('issuesTableBody');
+        const rows = Array.from(tableBody.querySelectorAll('.draggable-row'));
+        
+        // Find the positions
+        const draggedIndex = rows.indexOf(draggedElement);
+        const targetIndex = rows.indexOf(this);
+        
+        if (draggedIndex !== -1 && targetIndex !== -1) {
+            // Move the element in the DOM
+            if (draggedIndex < targetIndex) {
+                this.parentNode.insertBefore(draggedElement, this.nextSibling);
+            } else {
+                this.parentNode.insertBefore(draggedElement, this);
+            }
+            
+            // Update the order on the server
+            updateIssueOrder();
+        }
+    }
+    
+    this.style.backgroundColor = '';
+    this.classList.remove('drag-over');
+    return false;
+}
+
+function updateIssueOrder() {
+    const tableBody = document.getElementById('issuesTableBody');
+    const rows = tableBody.querySelectorAll('.draggable-row');
+    const issueIds = Array.from(rows).map(row => row.getAttribute('data-issue-id'));
+    
+    fetch('/issues/reorder', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            issue_ids: issueIds
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            // Show a subtle success indicator
+            showReorderSuccess();
+        } else {
+            console.error('Failed to reorder issues:', data.error);
+            // Optionally show an error message
+        }
+    })
+    .catch(error => {
+        console.error('Error reordering issues:', error);
+    });
+}
+
+function showReorderSuccess() {
+    // Create a temporary success message
+    const successMsg = document.createElement('div');
+    successMsg.textContent = 'Issues reordered successfully!';
+    successMsg.className = 'fixed top-4 right-4 bg-green-500 text-white px-4 py-2 rounded-md shadow-lg z-50';
+    successMsg.style.transition = 'opacity 0.3s ease';
+    
+    document.body.appendChild(successMsg);
+    
+    // Remove after 2 seconds
+    setTimeout(() => {
+        successMsg.style.opacity = '0';
+        setTimeout(() => {
+            if (successMsg.parentNode) {
+                successMsg.parentNode.removeChild(successMsg);
+            }
+        }, 300);
+    }, 2000);
+}
@@ -0,0 +1,77 @@
+let currentOrganizationId = null;
+
+function openAddOrganizationModal() {
+    document.getElementById('addOrganizationModal').classList.remove('hidden');
+}
+
+function closeAddOrganizationModal() {
+    document.getElementById('addOrganizationModal').classList.add('hidden');
+    document.getElementById('addOrganizationForm').reset();
+}
+
+function confirmDeleteOrganization(orgId, orgName) {
+    currentOrganizationId = orgId;
+    document.getElementById('deleteModalTitle').textContent = 'Delete Organisation';
+    document.getElementById('deleteModalMessage').textContent = `Delete organisation '${orgName}'? This cannot be undone.`;
+    document.getElementById('deleteOrganizationModal').classList.remove('hidden');
+}
+
+function closeDeleteOrganizationModal() {
+    document.getElementById('deleteOrganizationModal').classList.add('hidden');
+    currentOrganizationId = null;
+}
+
+function deleteOrganization() {
+    if (currentOrganizationId) {
+        htmx.ajax('DELETE', `/organizations/${currentOrganizationId}`, {
+            target: `#organization-${currentOrganizationId}`,
+            swap: 'outerHTML'
+        }).then(closeDeleteOrganizationModal);
+    }
+}
+
+function showDeleteError(orgId, orgName, issueCount) {
+    let message;
+    if (typeof orgName === 'string' && issueCount !== undefined) {
+        message = `Can't delete '${orgName}'. It's used by ${issueCount} issue${issueCount !== 1 ? 's' : ''}. Reassign or close those issues first.`;
+    } else {
+        message = orgName; // orgName is actually the error message in this case
+    }
+    
+    document.getElementById('errorMessage').textContent = message;
+    document.getElementById('errorModal').classList.remove('hidden');
+}
+
+function closeErrorModal() {
+    document.getElementById('errorModal').classList.add('hidden');
+}
+
+// Failed requests open the error modal rather than the default alert
+function showRequestError(message) {
+    showDeleteError(null, message);
+}
+
+// Add organisation form submission
+const addOrganizationForm = document.getElementById('addOrganizationForm');
+addOrganizationForm.addEventListener('submit', function(e) {
+    e.preventDefault();
+    htmx.ajax('POST', '/organizations', {
+        source: this,
+        target: '#organizationList',
+        swap: 'beforeend'
+    });
+});
+addOrganizationForm.addEventListener('htmx:afterRequest', function(e) {
+    if (e.detail.successful) {
+        closeAddOrganizationModal();
+    }
+});
+
+// Close modals when clicking outside
+document.addEventListener('click', function(e) {
+    if (e.target.classList.contains('fixed')) {
+        closeAddOrganizationModal();
+        closeDeleteOrganizationModal();
+        closeErrorModal();
+    }
+});
@@ -0,0 +1,14 @@
+/** Used by `flask --app app build-assets` to emit the purged stylesheet. */
+module.exports = {
+  content: ['./templates/**/*.html', './static/js/**/*.js'],
+  theme: {
+    extend: {
+      colors: {
+        'priority-p1': '#dc2626',
+        'priority-p2': '#ea580c',
+        'priority-p3': '#2563eb',
+        'priority-p4': '#6b7280'
+      }
+    }
+  }
+}
@@ -0,0 +1,33 @@
+"""
+Template compilation at startup.
+
+Templates are compiled through a Jinja FileSystemBytecodeCache in
+TEMPLATE_CACHE_DIR (instance/template_cache by default), shared by every
+worker on the machine, and create_app() warms them all up front. The first
+process after a deploy compiles each template once and writes the bytecode;
+later workers only load it, and none of them pays for compilation on its
+first request. Run gunicorn with --preload and the workers fork with the
+templates already in memory.
+"""
+import os
+from jinja2 import FileSystemBytecodeCache
+
+def init_templates(app):
+    app.config.setdefault('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'template_cache'))
+    app.config.setdefault('TEMPLATE_WARMUP', True)
+
+    cache_dir = app.config['TEMPLATE_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Must be set before app.jinja_env is first created
+        app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(cache_dir)}
+
+    if app.config['TEMPLATE_WARMUP']:
+        warm_templates(app)
+
+def warm_templates(app):
+    """Load every template into the environment's cache and return their names"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return names
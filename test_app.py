@@ -1,14 +1,26 @@
+import os
+import io
 import pytest
 import json
 from datetime import date
-from app import app, db, Issue, Organization
+from itertools import islice
+from app import create_app, db, Issue, Organization
+from backends import normalize_database_url
+
+# Point this at a throwaway PostgreSQL database to run the backend tests there too
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
 
 @pytest.fixture
-def client():
-    app.config['TESTING'] = True
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
-    app.config['WTF_CSRF_ENABLED'] = False
-    
+def app():
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'WTF_CSRF_ENABLED': False
+    })
+    return app
+
+@pytest.fixture
+def client(app):
     with app.test_client() as client:
         with app.app_context():
             db.create_all()
@@ -17,6 +29,54 @@ def client():
 @pytest.fixture
 def auth_client(client):
     """Client with authentication"""
+    return logged_in(client)
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def backend_client(request):
+    """Authenticated client against each supported database backend"""
+    if request.param == 'postgresql':
+        if not TEST_DATABASE_URL:
+            pytest.skip('TEST_DATABASE_URL not set')
+        uri = normalize_database_url(TEST_DATABASE_URL)
+    else:
+        uri = 'sqlite:///:memory:'
+    
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': uri})
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield logged_in(client)
+            db.session.remove()
+            db.drop_all()
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """App with separate SQLite primary and replica files"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "primary.sqlite3"}',
+        'REPLICA_DATABASE_URL': f'sqlite:///{tmp_path / "replica.sqlite3"}',
+        'REPLICA_STICKY_SECONDS': 60
+    })
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(app.extensions['replica'])
+    return app
+
+@pytest.fixture
+def sharded_app(tmp_path):
+    """App with a SQLite primary and a SHARDS_DIR of per-organisation shards"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "primary.sqlite3"}',
+        'SHARDS_DIR': str(tmp_path / 'shards')
+    })
+    with app.app_context():
+        db.create_all()
+    return app
+
+def logged_in(client):
+    """Mark a test client's session as logged in, and return the client"""
     with client.session_transaction() as sess:
         sess['authenticated'] = True
     return client
@@ -321,3 +381,1043 @@ def test_unarchive_non_archived_issue(auth_client, sample_organization):
     data = json.loads(response.data)
     assert data['success'] == False
     assert 'not archived' in data['error']
+
+def test_create_app_does_no_database_work(tmp_path):
+    """Test the app factory boots without touching the database"""
+    db_file = tmp_path / 'boot.sqlite3'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}'})
+    assert app.name == 'app'
+    assert not db_file.exists()
+
+def test_init_db_and_seed_commands(tmp_path):
+    """Test the one-shot init-db and seed CLI commands"""
+    db_file = tmp_path / 'cli.sqlite3'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}'})
+    runner = app.test_cli_runner()
+    
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0
+    assert 'Database initialised' in result.output
+    
+    result = runner.invoke(args=['seed'])
+    assert result.exit_code == 0
+    with app.app_context():
+        assert Organization.query.count() == 6
+        assert Issue.query.count() == 11
+    
+    # Seeding again must not duplicate the sample data
+    runner.invoke(args=['seed'])
+    with app.app_context():
+        assert Issue.query.count() == 11
+
+def test_normalize_database_url():
+    """Test the postgres:// scheme is rewritten for SQLAlchemy"""
+    assert normalize_database_url('postgres://u:p@host/db') == 'postgresql+psycopg2://u:p@host/db'
+    assert normalize_database_url('postgresql://u:p@host/db') == 'postgresql+psycopg2://u:p@host/db'
+    assert normalize_database_url('postgresql+psycopg2://u@host/db') == 'postgresql+psycopg2://u@host/db'
+    assert normalize_database_url('sqlite:///db.sqlite3') == 'sqlite:///db.sqlite3'
+
+def test_search_is_case_insensitive(backend_client):
+    """Test search matches regardless of case and treats % literally"""
+    db.session.add(Issue(title='Login Timeout', reporter='Ann', date_reported=date.today()))
+    db.session.add(Issue(title='100% CPU', reporter='Bob', date_reported=date.today()))
+    db.session.commit()
+    
+    response = backend_client.get('/?q=login')
+    assert b'Login Timeout' in response.data
+    assert b'100% CPU' not in response.data
+    
+    response = backend_client.get('/?q=0%25')
+    assert b'100% CPU' in response.data
+    assert b'Login Timeout' not in response.data
+
+def test_reorder_issues(backend_client):
+    """Test drag-and-drop reordering updates every position"""
+    ids = []
+    for title in ('First', 'Second', 'Third'):
+        issue = Issue(title=title, reporter='Ann', date_reported=date.today())
+        db.session.add(issue)
+        db.session.commit()
+        ids.append(issue.id)
+    
+    new_order = [ids[2], ids[0], ids[1]]
+    response = backend_client.post('/issues/reorder',
+                                   data=json.dumps({'issue_ids': [str(i) for i in new_order]}),
+                                   content_type='application/json')
+    assert response.status_code == 200
+    
+    db.session.expire_all()
+    ordered = Issue.query.order_by(Issue.display_order).all()
+    assert [issue.id for issue in ordered] == new_order
+
+def test_import_export_round_trip(backend_client):
+    """Test bulk import and filtered export on each backend"""
+    csv_data = (
+        'Title,Description,Organisation,Status,Reporter,Owner,Importance,Date Reported,Target Date\n'
+        'Imported one,"Quoted, with comma",Acme,Open,Ann,Bob,High,2025-01-02,2025-02-01\n'
+        'Imported two,,Acme,In Progress,Cat,,Low,2025-01-03,\n'
+    )
+    response = backend_client.post('/import', data={
+        'file': (io.BytesIO(csv_data.encode()), 'issues.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    
+    assert Issue.query.count() == 2
+    imported = Issue.query.filter_by(title='Imported two').first()
+    assert imported.owner is None
+    assert imported.organization.name == 'Acme'
+    assert imported.display_order == 0
+    
+    response = backend_client.get('/export.csv?q=one')
+    lines = response.data.decode().splitlines()
+    assert lines[0].startswith('Title,Description,Organisation')
+    assert lines[1:] == ['Imported one,"Quoted, with comma",Acme,Open,2025-01-02,Ann,Bob,High,2025-02-01']
+
+def test_export_csv_streams_large_exports(backend_client):
+    """Test the PostgreSQL export is sent as COPY produces it, and stopping it early is safe"""
+    csv_data = 'Title,Description,Organisation,Status,Reporter,Owner,Importance,Date Reported,Target Date\n' + ''.join(
+        f'Issue {n},Printer {n} on floor {n * 7} is jammed,Acme,Open,Ann,,Low,2025-01-02,\n' for n in range(3000))
+    response = backend_client.post('/import', data={
+        'file': (io.BytesIO(csv_data.encode()), 'issues.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 302
+    assert Issue.query.count() == 3000
+    
+    response = backend_client.get('/export.csv')
+    lines = response.data.decode().splitlines()
+    assert len(lines) == 3001
+    assert 'Issue 2999,Printer 2999 on floor 20993 is jammed,Acme,Open,2025-01-02,Ann,,Low,' in lines
+    
+    response = backend_client.get('/export.csv', buffered=False)
+    header, *rows = islice(response.iter_encoded(), 2)
+    if db.engine.dialect.name == 'postgresql':
+        # The header goes out before COPY has produced a row, then the rows a chunk at a time
+        assert header == b'Title,Description,Organisation,Status,Date Reported,Reported By,Owner,Importance,Target Date\n'
+        assert rows[0].startswith(b'Issue ') and rows[0].count(b'\n') < 3000
+    # The client goes away mid-export: the copy is cancelled and the app carries on
+    response.close()
+    
+    db.session.remove()
+    assert backend_client.get('/?q=Issue 2999').status_code == 200
+    assert Issue.query.count() == 3000
+
+def test_migrate_database_adds_missing_columns(tmp_path):
+    """Test migrations upgrade a database created before display_order/archived/version and later indexes"""
+    import sqlite3
+    db_file = tmp_path / 'old.sqlite3'
+    conn = sqlite3.connect(db_file)
+    conn.execute("CREATE TABLE issue (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, "
+                 "reporter VARCHAR(100) NOT NULL, status VARCHAR(50), date_reported DATE, "
+                 "target_date DATE, updated_at DATETIME)")
+    conn.execute("INSERT INTO issue (title, reporter, status, date_reported) VALUES "
+                 "('Later', 'Ann', 'Open', '2025-02-01'), ('Earlier', 'Ann', 'Completed', '2025-01-01')")
+    conn.commit()
+    conn.close()
+    
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}'})
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0
+    
+    conn = sqlite3.connect(db_file)
+    rows = conn.execute("SELECT title, display_order, archived, version FROM issue ORDER BY id").fetchall()
+    indexes = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+    assert rows == [('Later', 1, 0, 1), ('Earlier', 0, 1, 1)]
+    assert {'ix_issue_open_target_date', 'ix_issue_updated_at'} <= indexes
+
+def test_read_only_routes_use_replica(replica_app):
+    """Test listing routes read from the replica and writes go to the primary"""
+    with replica_app.app_context():
+        with replica_app.extensions['replica'].begin() as conn:
+            conn.execute(Issue.__table__.insert().values(
+                title='Only on replica', reporter='Ann', date_reported=date.today(), archived=False))
+    
+    client = logged_in(replica_app.test_client())
+    
+    response = client.get('/')
+    assert b'Only on replica' in response.data
+    
+    response = client.post('/issues', data=json.dumps({
+        'title': 'Fresh write', 'reporter': 'Bob'
+    }), content_type='application/json')
+    assert response.status_code == 200
+    
+    # Read-your-writes: this browser now reads from the primary
+    response = client.get('/')
+    assert b'Fresh write' in response.data
+    assert b'Only on replica' not in response.data
+    
+    # Other browsers still read from the replica
+    other = logged_in(replica_app.test_client())
+    response = other.get('/')
+    assert b'Only on replica' in response.data
+    assert b'Fresh write' not in response.data
+    
+    # The edit form carries the version a save is checked against, so it comes from the primary
+    with replica_app.app_context():
+        issue_id = db.session.execute(db.select(Issue.id).where(Issue.title == 'Fresh write')).scalar_one()
+    assert client.post(f'/issues/{issue_id}', json={'version': 1, 'owner': 'Alice'}).get_json()['version'] == 2
+    response = other.get(f'/issues/{issue_id}/edit')
+    assert b'name="version" value="2"' in response.data
+    response = other.post(f'/issues/{issue_id}', data={'version': '2', 'owner': 'Carol'})
+    assert response.status_code == 200
+
+def test_snapshot_replica_command(replica_app):
+    """Test the snapshot-replica command copies the primary over the replica"""
+    with replica_app.app_context():
+        db.session.add(Issue(title='Snapshotted', reporter='Ann', date_reported=date.today()))
+        db.session.commit()
+    
+    result = replica_app.test_cli_runner().invoke(args=['snapshot-replica'])
+    assert result.exit_code == 0
+    
+    with replica_app.app_context():
+        with replica_app.extensions['replica'].connect() as conn:
+            titles = conn.execute(Issue.__table__.select()).all()
+    assert [row.title for row in titles] == ['Snapshotted']
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_export_columnar(auth_client, sample_organization, fmt):
+    """Test Parquet/Arrow export keeps types and joins organisations and comments"""
+    pa = pytest.importorskip('pyarrow')
+    from models import Comment
+    
+    issue = Issue(title='Columnar', reporter='Ann', organization_id=sample_organization.id,
+                  date_reported=date(2025, 1, 2), target_date=date(2025, 3, 1))
+    other = Issue(title='Filtered out', reporter='Bob', status='Completed', date_reported=date(2025, 1, 1))
+    db.session.add_all([issue, other])
+    db.session.commit()
+    db.session.add(Comment(issue_id=issue.id, author='Cat', body='First comment'))
+    db.session.commit()
+    
+    response = auth_client.get(f'/export.{fmt}?status=Open')
+    assert response.status_code == 200
+    
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(pa.BufferReader(response.data))
+    else:
+        table = pa.ipc.open_stream(response.data).read_all()
+    
+    assert table.num_rows == 1
+    row = table.to_pylist()[0]
+    assert row['title'] == 'Columnar'
+    assert row['organisation'] == 'Test Organization'
+    assert row['date_reported'] == date(2025, 1, 2)
+    assert table.schema.field('date_reported').type == pa.date32()
+    assert [(c['author'], c['body']) for c in row['comments']] == [('Cat', 'First comment')]
+
+def test_export_columnar_streams_batches(client):
+    """Test the columnar writer emits one chunk per batch of rows"""
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    import pyarrow as pa
+    import columnar
+    
+    for n in range(5):
+        db.session.add(Issue(title=f'Issue {n}', reporter='Ann', date_reported=date.today()))
+    db.session.commit()
+    
+    stmt = db.select(
+        Issue.id, Issue.title, Issue.description, Issue.owner, Issue.status, Issue.importance,
+        Issue.reporter, Issue.owner, Issue.date_reported, Issue.target_date, Issue.display_order,
+        Issue.archived, Issue.created_at, Issue.updated_at
+    ).order_by(Issue.id)
+    chunks = list(columnar.stream_export(db.session.connection(), stmt, 'parquet', batch_size=2))
+    
+    # Three row groups plus the footer
+    assert len(chunks) == 4
+    parquet_file = pq.ParquetFile(pa.BufferReader(b''.join(chunks)))
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.metadata.num_rows == 5
+
+def test_import_reports_invalid_rows(auth_client):
+    """Test invalid rows are skipped and listed while valid rows are imported"""
+    csv_data = (
+        'Title,Organisation,Status,Reported By,Importance,Date Reported,Target Date\n'
+        'Good row,Acme,Open,Ann,High,2025-01-02,\n'
+        ',Acme,Open,Ann,High,2025-01-02,\n'
+        'Bad status,Acme,Doing,Ann,High,2025-01-02,\n'
+        'Bad date,Acme,Open,Ann,Low,02/01/2025,\n'
+        'Compact date,Acme,Open,Ann,Low,20250102,\n'
+        'Week date,Acme,Open,Ann,Low,2025-W01-1,\n'
+        'Unpadded date,Acme,Open,Ann,Low,2025-1-2,\n'
+        'Defaults,,,Bob,,,\n'
+    )
+    response = auth_client.post('/import', data={
+        'file': (io.BytesIO(csv_data.encode('utf-8-sig')), 'issues.csv')
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert b'Imported 3 issues; 5 problems found' in response.data
+    assert b'Title is required' in response.data
+    assert b'&#39;Doing&#39; is not one of' in response.data
+    assert b'&#39;02/01/2025&#39; is not a YYYY-MM-DD date' in response.data
+    assert b'&#39;20250102&#39; is not a YYYY-MM-DD date' in response.data
+    assert b'&#39;2025-W01-1&#39; is not a YYYY-MM-DD date' in response.data
+    
+    assert sorted(issue.title for issue in Issue.query.all()) == ['Defaults', 'Good row', 'Unpadded date']
+    assert Issue.query.filter_by(title='Unpadded date').one().date_reported == date(2025, 1, 2)
+    defaults = Issue.query.filter_by(title='Defaults').first()
+    assert defaults.status == 'Open'
+    assert defaults.importance == 'Medium'
+    assert defaults.reporter == 'Bob'
+    assert defaults.date_reported == date.today()
+
+def test_import_batches_share_organisations(client):
+    """Test organisations are created once even when split across batches"""
+    from importer import import_issues
+    db.session.add(Organization(name='Existing'))
+    db.session.commit()
+    
+    csv_data = 'Title,Organisation\n' + ''.join(
+        f'Issue {n},{"Existing" if n % 2 else "New Org"}\n' for n in range(7))
+    result = import_issues(io.StringIO(csv_data), batch_size=2)
+    db.session.commit()
+    
+    assert result.imported == 7
+    assert result.errors == []
+    assert sorted(o.name for o in Organization.query.all()) == ['Existing', 'New Org']
+    new_org = Organization.query.filter_by(name='New Org').first()
+    assert Issue.query.filter_by(organization_id=new_org.id).count() == 4
+
+def test_pages_use_unbuilt_assets_by_default(auth_client):
+    """Test templates fall back to the CDN and unbundled scripts before a build"""
+    response = auth_client.get('/')
+    assert b'https://cdn.tailwindcss.com' in response.data
+    assert b'/static/js/index.js' in response.data
+    assert b'/static/js/app.js' in response.data
+
+def test_built_assets_are_hashed_and_precompressed(tmp_path):
+    """Test build-assets output is referenced by templates and served with immutable caching"""
+    import gzip
+    import shutil
+    from assets import build_assets
+    
+    static = tmp_path / 'static'
+    shutil.copytree(create_app().static_folder, static, ignore=shutil.ignore_patterns('dist', 'vendor'))
+    (static / 'vendor').mkdir()
+    (static / 'vendor' / 'htmx.min.js').write_text('var htmx = {};')
+    dist = tmp_path / 'dist'
+    manifest = build_assets(str(static), str(dist), lambda: b'.p-4{padding:1rem}')
+    
+    assert set(manifest) == {'app.css', 'app.js', 'index.js', 'archive.js', 'manage_organisations.js'}
+    assert manifest['app.css'].startswith('app.') and manifest['app.css'].endswith('.css')
+    
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'ASSETS_DIST_FOLDER': str(dist)
+    })
+    client = app.test_client()
+    
+    response = client.get('/login')
+    assert f'/assets/{manifest["app.css"]}'.encode() in response.data
+    assert b'cdn.tailwindcss.com' not in response.data
+    
+    response = client.get(f'/assets/{manifest["app.css"]}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert response.mimetype == 'text/css'
+    css = gzip.decompress(response.data)
+    assert css.startswith(b'.p-4{padding:1rem}')
+    assert b'.draggable-row' in css
+    
+    response = client.get(f'/assets/{manifest["app.js"]}', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'var htmx = {};')
+
+HTMX_HEADERS = {'HX-Request': 'true', 'HX-Current-URL': 'http://localhost/'}
+
+def test_issue_mutations_return_fragments_for_htmx(auth_client, sample_organization):
+    """Test HTMX mutations get the affected row and out-of-band updates, not JSON"""
+    response = auth_client.post('/issues', headers=HTMX_HEADERS, data={
+        'title': 'Fragment issue',
+        'reporter': 'Test User',
+        'owner': 'Alice',
+        'organization_id': str(sample_organization.id)
+    })
+    html = response.get_data(as_text=True)
+    issue = Issue.query.filter_by(title='Fragment issue').one()
+    assert html.startswith(f'<tr id="issue-{issue.id}"')
+    assert '<html' not in html
+    assert '<span id="issueCount" class="ml-2 text-sm font-normal text-gray-500" hx-swap-oob="true">1 issue</span>' in html
+    assert '<select id="ownerFilter" hx-swap-oob="innerHTML">' in html
+    assert '<option value="Alice" >Alice</option>' in html
+    
+    # Completing an issue archives it, so the index drops the row
+    response = auth_client.post(f'/issues/{issue.id}', headers=HTMX_HEADERS, data={'status': 'Completed'})
+    html = response.get_data(as_text=True)
+    assert '<tr' not in html
+    assert '>0 issues<' in html
+    
+    # Restoring it from the archive page drops it from the archive listing
+    archive_headers = {**HTMX_HEADERS, 'HX-Current-URL': 'http://localhost/archive'}
+    response = auth_client.post(f'/issues/{issue.id}/unarchive', headers=archive_headers)
+    html = response.get_data(as_text=True)
+    assert '<tr' not in html
+    assert '>0 issues<' in html
+    
+    # An issue that doesn't match the page's filters isn't added to it
+    filtered_headers = {**HTMX_HEADERS, 'HX-Current-URL': 'http://localhost/?owner=Bob'}
+    response = auth_client.post('/issues', headers=filtered_headers, data={'title': 'Other', 'reporter': 'Test User'})
+    html = response.get_data(as_text=True)
+    assert '<tr' not in html
+    assert '>0 issues<' in html
+    
+    response = auth_client.delete(f'/issues/{issue.id}', headers=HTMX_HEADERS)
+    html = response.get_data(as_text=True)
+    assert '<tr' not in html
+    assert '>1 issue<' in html
+    assert '<option value="Alice"' not in html
+
+def test_organization_mutations_return_fragments_for_htmx(auth_client):
+    """Test HTMX organisation changes get option lists or list rows back"""
+    response = auth_client.post('/organizations', data={'name': 'Acme'},
+                                headers={**HTMX_HEADERS, 'HX-Target': 'organizationSelect'})
+    html = response.get_data(as_text=True)
+    acme = Organization.query.filter_by(name='Acme').one()
+    assert html.startswith('<option value="">Select Organisation</option>')
+    assert f'<option value="{acme.id}" selected>Acme</option>' in html
+    assert '<select id="organizationFilter" hx-swap-oob="innerHTML">' in html
+    
+    response = auth_client.post('/organizations', data={'name': 'Globex'},
+                                headers={**HTMX_HEADERS, 'HX-Target': 'organizationList'})
+    globex = Organization.query.filter_by(name='Globex').one()
+    assert response.get_data(as_text=True).startswith(f'<li id="organization-{globex.id}"')
+    
+    response = auth_client.delete(f'/organizations/{globex.id}', headers=HTMX_HEADERS)
+    assert response.status_code == 200
+    assert response.data == b''
+    
+    # Failures stay JSON for the client's error handler
+    response = auth_client.post('/organizations', data={'name': 'Acme'}, headers=HTMX_HEADERS)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Organisation name already exists'
+
+def test_listings_use_row_projections(backend_client):
+    """Test the board reads compact rows with a description preview instead of ORM instances"""
+    from projections import issue_rows, IssueRow, DESCRIPTION_PREVIEW_LENGTH
+    from filters import current_filters, listing_statement
+    
+    organization = Organization(name='Projection Org')
+    db.session.add(organization)
+    db.session.flush()
+    long_description = 'x' * (DESCRIPTION_PREVIEW_LENGTH + 50)
+    db.session.add_all([
+        Issue(title='Long', description=long_description, reporter='R', organization_id=organization.id),
+        Issue(title='Short', description='Brief', reporter='R', owner='O')
+    ])
+    db.session.commit()
+    db.session.expunge_all()
+    
+    stmt, params = listing_statement('board', current_filters({}))
+    rows = sorted(issue_rows(db.session.execute(stmt, params)), key=lambda row: row.title)
+    assert all(isinstance(row, IssueRow) for row in rows)
+    assert not any(isinstance(instance, Issue) for instance in db.session.identity_map.values())
+    assert rows[0].title == 'Long'
+    assert rows[0].organization_name == 'Projection Org'
+    assert rows[0].description == 'x' * DESCRIPTION_PREVIEW_LENGTH + '…'
+    assert rows[1].description == 'Brief'
+    assert rows[1].organization_name is None
+    
+    response = backend_client.get('/')
+    assert ('x' * DESCRIPTION_PREVIEW_LENGTH + '…').encode() in response.data
+    assert long_description.encode() not in response.data
+
+def test_listing_statements_are_cached_per_filter_combination(backend_client):
+    """Test the board, archive and exports share one cached, parameterised filter compiler"""
+    from filters import current_filters, listing_statement
+    
+    organization = Organization(name='Filter Org')
+    db.session.add(organization)
+    db.session.flush()
+    db.session.add_all([
+        Issue(title='Printer 100% broken', reporter='R', status='Open', owner='Alice',
+              organization_id=organization.id),
+        Issue(title='Scanner_jam', reporter='R', status='In Progress', owner='Bob'),
+        Issue(title='Old printer', reporter='R', status='Completed', owner='Alice', archived=True)
+    ])
+    db.session.commit()
+    
+    # Same view and set of active filters -> the same statement object, whatever the values
+    open_board, params = listing_statement('board', current_filters({'status': 'Open'}))
+    assert params == {'status': 'Open'}
+    assert listing_statement('board', current_filters({'status': 'In Progress'}))[0] is open_board
+    assert listing_statement('board', current_filters({'owner': 'Bob'}))[0] is not open_board
+    assert listing_statement('archive', current_filters({'status': 'Open'}))[0] is not open_board
+    
+    def titles(view, **filters):
+        stmt, params = listing_statement(view, current_filters(filters))
+        return sorted(row.title for row in db.session.execute(stmt, params))
+    
+    assert titles('board') == ['Printer 100% broken', 'Scanner_jam']
+    assert titles('archive') == ['Old printer']
+    assert titles('board', status='Open') == ['Printer 100% broken']
+    assert titles('export_csv', owner='Alice') == ['Old printer', 'Printer 100% broken']
+    assert titles('export_columnar', organization=str(organization.id)) == ['Printer 100% broken']
+    assert titles('export_csv', q='PRINTER') == ['Old printer', 'Printer 100% broken']
+    # LIKE wildcards in the search text only match themselves
+    assert titles('export_csv', q='100%') == ['Printer 100% broken']
+    assert titles('export_csv', q='r_j') == ['Scanner_jam']
+    assert titles('export_csv', q='er_1') == []
+
+def test_templates_are_warmed_through_shared_bytecode_cache(tmp_path):
+    """Test create_app compiles every template up front and later workers reuse the bytecode"""
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'TEMPLATE_CACHE_DIR': str(tmp_path)
+    }
+    app = create_app(config)
+    assert 'index.html' in app.jinja_env.list_templates()
+    assert len(list(tmp_path.glob('__jinja2_*.cache'))) == len(app.jinja_env.list_templates())
+    
+    # A second worker loads the bytecode instead of compiling the templates again
+    second = create_app({**config, 'TEMPLATE_WARMUP': False})
+    def no_compile(*args, **kwargs):
+        raise AssertionError('template was compiled instead of loaded from the bytecode cache')
+    second.jinja_env.compile = no_compile
+    second.jinja_env.get_template('index.html')
+
+def test_sqlite_pragmas_and_server_timing(tmp_path):
+    """Test SQLITE_PRAGMAS configures connections and SERVER_TIMING reports commit time"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "db.sqlite3"}',
+        'SQLITE_PRAGMAS': 'journal_mode=wal, busy_timeout=2500',
+        'SERVER_TIMING': True
+    })
+    with app.app_context():
+        db.create_all()
+        assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(db.text('PRAGMA busy_timeout')).scalar() == 2500
+    
+    client = logged_in(app.test_client())
+    response = client.post('/organizations', json={'name': 'Timed'})
+    names = [part.split(';')[0] for part in response.headers['Server-Timing'].split(', ')]
+    assert names == ['db', 'commit']
+    
+    with pytest.raises(ValueError):
+        create_app({'SQLITE_PRAGMAS': 'journal_mode=wal; DROP TABLE issue'})
+
+def test_loadtest_smoke(tmp_path):
+    """Test the load generator drives a real server process and reports every request type"""
+    import loadtest
+    
+    seed_path = str(tmp_path / 'seed.sqlite3')
+    loadtest.seed_database(seed_path, 20)
+    results = loadtest.run('werkzeug', 'wal', seed_path, viewers=2, editors=2,
+                           duration=1.5, poll_interval=0.1, think_time=0.05)
+    rows = {row['request']: row for row in loadtest.summarize(results, 1.5)}
+    
+    assert {'view board', 'edit issue', 'comment'} <= set(rows)
+    assert all(row['error_rate'] == 0 for row in rows.values())
+    assert rows['edit issue']['lock_wait_p95'] is not None
+
+def test_write_coalescing_commits_concurrent_writes_in_batches(tmp_path):
+    """Test WRITE_COALESCING groups concurrent comments into few commits, keeping each caller's result"""
+    import threading
+    from sqlalchemy import event
+    from models import Comment
+    
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "db.sqlite3"}',
+        'WRITE_COALESCING': True,
+        'WRITE_BATCH_WINDOW_MS': 100
+    })
+    with app.app_context():
+        db.create_all()
+        issue = Issue(title='Incident', reporter='Test User', status='Open', importance='High',
+                      date_reported=date.today())
+        db.session.add(issue)
+        db.session.commit()
+        issue_id = issue.id
+        commits = []
+        event.listen(db.engine, 'commit', lambda conn: commits.append(conn))
+    
+    statuses = {}
+    def comment(number, target_id):
+        client = logged_in(app.test_client())
+        response = client.post(f'/issues/{target_id}/comment',
+                               json={'author': 'Responder', 'body': f'Update {number}'})
+        statuses[number] = response.status_code
+    
+    # One comment on a missing issue fails without affecting the rest of its batch
+    threads = [threading.Thread(target=comment, args=(number, issue_id)) for number in range(10)]
+    threads.append(threading.Thread(target=comment, args=(10, issue_id + 1)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert [statuses[number] for number in range(10)] == [200] * 10
+    assert statuses[10] == 404
+    assert len(commits) < 10
+    
+    client = logged_in(app.test_client())
+    response = client.post(f'/issues/{issue_id}/unarchive')
+    assert response.status_code == 400
+    response = client.post(f'/issues/{issue_id}', json={'status': 'Completed'})
+    assert response.status_code == 200
+    
+    with app.app_context():
+        assert Comment.query.filter_by(issue_id=issue_id).count() == 10
+        assert db.session.get(Issue, issue_id).archived == True
+
+def test_update_issue_rejects_stale_versions(backend_client):
+    """Test edits are conditional on the version the client loaded, and a stale one gets a 409"""
+    issue = Issue(title='Shared issue', reporter='Test User', status='Completed', importance='Medium',
+                  date_reported=date.today(), archived=True)
+    db.session.add(issue)
+    db.session.commit()
+    issue_id = issue.id
+    assert issue.version == 1
+    
+    response = backend_client.post(f'/issues/{issue_id}/unarchive', json={'version': 1})
+    assert response.get_json() == {'success': True, 'version': 2}
+    
+    # Two editors opened the form at version 2; the second save must not overwrite the first
+    response = backend_client.post(f'/issues/{issue_id}', json={'version': 2, 'owner': 'Alice'})
+    assert response.get_json() == {'success': True, 'version': 3}
+    response = backend_client.post(f'/issues/{issue_id}', json={'version': 2, 'owner': 'Bob'})
+    assert response.status_code == 409
+    assert response.get_json()['success'] == False
+    
+    # Still Completed, so saving without a status re-archives it, as before
+    db.session.expire_all()
+    issue = db.session.get(Issue, issue_id)
+    assert (issue.owner, issue.version, issue.archived) == ('Alice', 3, True)
+    
+    response = backend_client.post(f'/issues/{issue_id}/unarchive', json={'version': 2})
+    assert response.status_code == 409
+    response = backend_client.post(f'/issues/{issue_id + 1}', json={'version': 1})
+    assert response.status_code == 404
+    
+    # A version that isn't a whole number is a bad request, from JSON or form clients
+    for data in [{'json': {'version': 'abc', 'owner': 'Eve'}}, {'json': {'version': 2.5}},
+                 {'data': {'version': 'three', 'owner': 'Eve'}}]:
+        response = backend_client.post(f'/issues/{issue_id}', **data)
+        assert response.status_code == 400
+        assert response.get_json() == {'success': False, 'error': 'Version must be a whole number'}
+    response = backend_client.post(f'/issues/{issue_id}/unarchive', json={'version': 'x'})
+    assert response.status_code == 400
+    db.session.expire_all()
+    assert db.session.get(Issue, issue_id).owner == 'Alice'
+
+def test_sharding_keeps_each_organisations_issues_in_its_own_file(sharded_app):
+    """Test SHARDS_DIR routes issues to per-organisation files and fans reads out across them"""
+    from models import Comment
+    app = sharded_app
+    shards_dir = app.config['SHARDS_DIR']
+    with app.app_context():
+        db.session.add_all([Organization(name='Alpha'), Organization(name='Beta')])
+        db.session.commit()
+        alpha, beta = [organization.id for organization in Organization.query.order_by(Organization.id)]
+        
+        # Outside a route there is no shard to send issue statements to
+        with pytest.raises(RuntimeError):
+            Issue.query.count()
+    
+    client = logged_in(app.test_client())
+    
+    def create(title, organization_id, date_reported):
+        response = client.post('/issues', json={'title': title, 'reporter': 'Test User',
+                                                'organization_id': organization_id,
+                                                'date_reported': date_reported})
+        return response.get_json()['id']
+    
+    first = create('Alpha first', alpha, '2025-01-01')
+    second = create('Beta second', beta, '2025-01-02')
+    third = create('Unassigned third', None, '2025-01-03')
+    fourth = create('Alpha fourth', alpha, '2025-01-04')
+    assert len({first, second, third, fourth}) == 4
+    assert sorted(os.listdir(shards_dir)) == [f'organization-{alpha}.sqlite3', f'organization-{beta}.sqlite3',
+                                              'unassigned.sqlite3']
+    
+    # Reads across every shard come back merged in the listing's order
+    response = client.get('/export.csv')
+    titles = [line.split(',')[0] for line in response.data.decode().splitlines()[1:]]
+    assert titles == ['Alpha first', 'Beta second', 'Unassigned third', 'Alpha fourth']
+    response = client.get(f'/export.csv?organization={beta}')
+    assert response.data.decode().splitlines()[1:] == ['Beta second,,Beta,Open,2025-01-02,Test User,,Medium,']
+    
+    client.post('/issues/reorder', json={'issue_ids': [fourth, third, second, first]})
+    response = client.get('/')
+    board = response.data.decode()
+    assert board.index('Alpha fourth') < board.index('Unassigned third') < board.index('Beta second') \
+        < board.index('Alpha first')
+    
+    # Changing organisation moves the issue, and its comments, to the other shard
+    assert client.post(f'/issues/{first}/comment', json={'author': 'A', 'body': 'Moving'}).status_code == 200
+    response = client.post(f'/issues/{first}', json={'organization_id': beta, 'version': 1})
+    assert response.get_json() == {'success': True, 'version': 2}
+    assert client.post(f'/issues/{first}', json={'owner': 'Bob', 'version': 1}).status_code == 409
+    response = client.get('/manage-organisations')
+    assert response.status_code == 200
+    
+    with app.app_context():
+        from sharding import use_shard
+        use_shard(beta)
+        assert {issue.title for issue in Issue.query} == {'Alpha first', 'Beta second'}
+        assert Comment.query.filter_by(issue_id=first).count() == 1
+        use_shard(alpha)
+        assert [issue.title for issue in Issue.query] == ['Alpha fourth']
+        assert Comment.query.count() == 0
+    
+    assert client.delete(f'/issues/{fourth}').status_code == 200
+    assert client.get(f'/issues/{fourth}/edit').status_code == 404
+    assert client.delete(f'/organizations/{beta}').status_code == 400
+    assert client.delete(f'/organizations/{alpha}').status_code == 200
+    assert f'organization-{alpha}.sqlite3' not in os.listdir(shards_dir)
+
+def test_init_db_moves_existing_issues_into_shards(tmp_path):
+    """Test turning sharding on for an existing database moves its issues into shards on init-db"""
+    uri = f'sqlite:///{tmp_path / "primary.sqlite3"}'
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri})
+    with app.app_context():
+        # An organisation table from before ids were AUTOINCREMENT
+        db.session.execute(db.text('CREATE TABLE organization (id INTEGER NOT NULL PRIMARY KEY, '
+                                   'name VARCHAR(100) NOT NULL UNIQUE, created_at DATETIME)'))
+        db.session.commit()
+        db.create_all()
+        organization = Organization(name='Existing')
+        db.session.add(organization)
+        db.session.flush()
+        db.session.add_all([
+            Issue(title='Old one', reporter='Ann', organization_id=organization.id, date_reported=date(2025, 1, 1)),
+            Issue(title='Old two', reporter='Ann', date_reported=date(2025, 1, 2)),
+        ])
+        db.session.commit()
+    
+    app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'SHARDS_DIR': str(tmp_path / 'shards')})
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0
+    assert 'Moved 2 issues' in result.output
+    assert "Rebuilt the organization table" in result.output
+    with app.app_context():
+        assert 'AUTOINCREMENT' in db.session.execute(db.text(
+            "SELECT sql FROM sqlite_master WHERE name = 'organization'")).scalar().upper()
+    
+    client = logged_in(app.test_client())
+    response = client.get('/export.csv')
+    assert [line.split(',')[0] for line in response.data.decode().splitlines()[1:]] == ['Old one', 'Old two']
+
+def test_sharded_import_copies_new_organisations_into_their_shards(sharded_app):
+    """Test an import naming a new organisation shows it on the issues in that organisation's shard"""
+    client = logged_in(sharded_app.test_client())
+    csv_data = 'Title,Description,Organisation,Status,Date Reported,Reported By\n' \
+               'Broken thing,desc here,Brand New Org,Open,2025-01-01,Ann\n'
+    response = client.post('/import', data={'file': (io.BytesIO(csv_data.encode()), 'issues.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 302
+    
+    response = client.get('/export.csv')
+    assert response.data.decode().splitlines()[1].startswith('Broken thing,desc here,Brand New Org,Open,')
+
+def test_deleted_organisation_shards_are_never_reused(tmp_path):
+    """Test a new organisation never inherits a deleted one's shard, even in a worker that had it open"""
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "primary.sqlite3"}',
+        'SHARDS_DIR': str(tmp_path / 'shards')
+    }
+    # Two apps stand in for two worker processes
+    worker_a, worker_b = create_app(config), create_app(config)
+    with worker_a.app_context():
+        db.create_all()
+    client_a, client_b = logged_in(worker_a.test_client()), logged_in(worker_b.test_client())
+    
+    first = client_a.post('/organizations', json={'name': 'First'}).get_json()['id']
+    issue_id = client_b.post('/issues', json={'title': 'In first', 'reporter': 'R',
+                                              'organization_id': first}).get_json()['id']
+    assert client_a.delete(f'/issues/{issue_id}').status_code == 200
+    assert client_a.delete(f'/organizations/{first}').status_code == 200
+    
+    second = client_a.post('/organizations', json={'name': 'Second'}).get_json()['id']
+    assert second != first
+    response = client_b.post('/issues', json={'title': 'In second', 'reporter': 'R', 'organization_id': second})
+    assert response.status_code == 200
+    assert client_a.get('/export.csv').data.decode().splitlines()[1].startswith('In second,,Second,')
+    
+    # A worker whose cached shard was dropped by another opens the file afresh
+    with worker_b.app_context():
+        shards = worker_b.extensions['shards']
+        engine = shards.engine(second)
+        os.remove(shards.path(second))
+        assert shards.engine(second) is not engine
+        assert os.path.exists(shards.path(second))
+
+def test_shared_cache_is_shared_by_workers_and_invalidated_by_writes(tmp_path, monkeypatch):
+    """Test board snapshots are shared across app processes and one write invalidates them everywhere"""
+    import sqlite3
+    db_file = tmp_path / 'db.sqlite3'
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_file}',
+        'SHARED_CACHE_PATH': str(tmp_path / 'cache.sqlite3')
+    }
+    # Two apps stand in for two worker processes
+    worker_a, worker_b = create_app(config), create_app(config)
+    with worker_a.app_context():
+        db.create_all()
+        issue = Issue(title='Cached title', reporter='Test User', owner='Alice', date_reported=date.today())
+        db.session.add(issue)
+        db.session.commit()
+        issue_id = issue.id
+    
+    clients = []
+    for worker in (worker_a, worker_b):
+        client = logged_in(worker.test_client())
+        clients.append(client)
+    client_a, client_b = clients
+    
+    assert b'Cached title' in client_a.get('/').data
+    # Changed behind the app's back: worker B is still served worker A's snapshot
+    conn = sqlite3.connect(db_file)
+    conn.execute("UPDATE issue SET title = 'Changed title', owner = 'Bob'")
+    conn.commit()
+    conn.close()
+    page = client_b.get('/').data
+    assert b'Cached title' in page and b'Bob' not in page
+    
+    # A write through either worker invalidates every worker's snapshots
+    response = client_a.post(f'/issues/{issue_id}', json={'owner': 'Carol'})
+    assert response.status_code == 200
+    page = client_b.get('/').data
+    assert b'Changed title' in page and b'Carol' in page
+    assert b'Changed title' in client_b.get('/?owner=Carol').data
+    
+    # A locked cache file doesn't fail a committed write; that worker bypasses the cache until it can bump
+    store = worker_a.extensions['shared_cache']
+    store._connection().execute('PRAGMA busy_timeout = 0')
+    lock = sqlite3.connect(tmp_path / 'cache.sqlite3', isolation_level=None)
+    lock.execute('BEGIN IMMEDIATE')
+    response = client_a.post(f'/issues/{issue_id}', json={'owner': 'Dave'})
+    assert response.status_code == 200
+    assert b'Dave' in client_a.get('/').data
+    lock.execute('ROLLBACK')
+    lock.close()
+    assert b'Dave' in client_a.get('/').data and b'Dave' in client_b.get('/').data
+    
+    # Free-text searches don't grow the cache without bound
+    monkeypatch.setattr('shared_cache.MAX_ENTRIES', 5)
+    for query in range(20):
+        client_a.get(f'/?q=search{query}')
+    conn = sqlite3.connect(tmp_path / 'cache.sqlite3')
+    assert conn.execute('SELECT count(*) FROM entry').fetchone()[0] == 5
+    conn.close()
+
+def test_due_filters_and_sla_scanner(backend_client):
+    """Test the overdue/due soon filters, and the SLA counts kept up to date incrementally"""
+    from datetime import timedelta
+    from filters import current_filters, listing_statement
+    
+    today = date.today()
+    organization = Organization(name='SLA Org')
+    db.session.add(organization)
+    db.session.flush()
+    db.session.add_all([
+        Issue(title='Late', reporter='R', owner='Alice', organization_id=organization.id,
+              target_date=today - timedelta(days=3)),
+        Issue(title='Yesterday', reporter='R', owner='Bob', target_date=today - timedelta(days=1)),
+        Issue(title='Soon', reporter='R', owner='Alice', target_date=today + timedelta(days=2)),
+        Issue(title='Later', reporter='R', owner='Alice', target_date=today + timedelta(days=30)),
+        Issue(title='Undated', reporter='R'),
+        Issue(title='Archived late', reporter='R', owner='Alice', archived=True,
+              target_date=today - timedelta(days=5))
+    ])
+    db.session.commit()
+    soon_id = Issue.query.filter_by(title='Soon').one().id
+    yesterday_id = Issue.query.filter_by(title='Yesterday').one().id
+    
+    def titles(**filters):
+        stmt, params = listing_statement('board', current_filters(filters))
+        return sorted(row.title for row in db.session.execute(stmt, params))
+    
+    assert titles(due='overdue') == ['Late', 'Yesterday']
+    assert titles(due='soon') == ['Soon']
+    # Unknown values don't filter
+    assert titles(due='someday') == ['Late', 'Later', 'Soon', 'Undated', 'Yesterday']
+    response = backend_client.get('/?due=overdue')
+    assert b'Late' in response.data and b'Soon' not in response.data
+    
+    if db.engine.dialect.name == 'sqlite':
+        stmt, params = listing_statement('board', current_filters({'due': 'overdue'}))
+        sql = stmt.params(params).compile(db.engine, compile_kwargs={'literal_binds': True})
+        plan = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+        assert any('ix_issue_open_target_date' in row[-1] for row in plan)
+    
+    scanner = backend_client.application.extensions['sla']
+    summary = scanner.summary()
+    assert (summary['overdue'], summary['due_soon']) == (2, 1)
+    assert dict(summary['owners']) == {'Alice': 1, 'Bob': 1}
+    assert dict(summary['organizations']) == {'SLA Org': 1, None: 1}
+    
+    # An edit that makes an issue overdue, and a delete, are picked up by the next scan
+    backend_client.post(f'/issues/{soon_id}', json={'target_date': str(today - timedelta(days=2))})
+    backend_client.delete(f'/issues/{yesterday_id}')
+    scanner.scan()
+    summary = scanner.summary()
+    assert (summary['overdue'], summary['due_soon']) == (2, 0)
+    assert dict(summary['owners']) == {'Alice': 2}
+    
+    # As the days pass, later target dates come due and then overdue
+    scanner.scan(today + timedelta(days=25))
+    assert (scanner.summary()['overdue'], scanner.summary()['due_soon']) == (2, 1)
+    scanner.scan(today + timedelta(days=31))
+    assert scanner.summary()['overdue'] == 3
+
+def test_near_duplicates_are_flagged_on_create_and_skipped_on_import(backend_client):
+    """Test the LSH duplicate index on create, edit, delete, import and the dedup pass"""
+    from models import IssueBucket
+    
+    def bucket_count(issue_id):
+        return IssueBucket.query.filter_by(issue_id=issue_id).count()
+    
+    text = 'The export button times out for large organisations after the last release'
+    response = backend_client.post('/issues', json={'title': 'Export times out', 'description': text,
+                                                    'reporter': 'Ann'})
+    original_id = response.get_json()['id']
+    assert bucket_count(original_id) > 0
+    
+    # Case, punctuation and a small wording change still match
+    response = backend_client.post('/issues', json={'title': 'Export times out!',
+                                                    'description': text.upper() + ' again', 'reporter': 'Bob'})
+    assert response.status_code == 409
+    assert response.get_json()['duplicate_of'] == original_id
+    response = backend_client.post('/issues', json={'title': 'Printer jams', 'description': 'Tray two',
+                                                    'reporter': 'Bob'})
+    assert response.status_code == 200
+    printer_id = response.get_json()['id']
+    response = backend_client.post('/issues', json={'title': 'Export times out', 'description': text,
+                                                    'reporter': 'Bob', 'allow_duplicate': True})
+    assert response.status_code == 200
+    copy_id = response.get_json()['id']
+    
+    # Saving the form with its text unchanged leaves the index alone
+    from sqlalchemy import event
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        backend_client.post(f'/issues/{printer_id}', json={'title': 'Printer jams', 'description': 'Tray  two.',
+                                                           'owner': 'Dan'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert any('UPDATE issue' in statement for statement in statements)
+    assert not any('issue_bucket' in statement for statement in statements)
+    
+    # Edits and deletes keep the index in step
+    backend_client.post(f'/issues/{printer_id}', json={'title': 'Scanner offline', 'description': 'Floor three'})
+    assert backend_client.post('/issues', json={'title': 'Printer jams', 'description': 'Tray two',
+                                                'reporter': 'Cat'}).status_code == 200
+    backend_client.delete(f'/issues/{copy_id}')
+    assert bucket_count(copy_id) == 0
+    
+    # Re-importing a file, or repeating rows within it, skips the copies
+    csv_data = (
+        'Title,Description,Reporter\n'
+        'Login loops,Users are sent back to the login page after signing in,Ann\n'
+        'Login loops,Users are sent back to the login page after signing in,Ann\n'
+        'Slow search,Searching by owner takes several seconds,Ann\n'
+    )
+    def import_file(**form):
+        return backend_client.post('/import', data={'file': (io.BytesIO(csv_data.encode()), 'issues.csv'), **form},
+                                   content_type='multipart/form-data', follow_redirects=True)
+    
+    assert b'Successfully imported 2 issues; skipped 1 likely duplicates' in import_file().data
+    assert b'Successfully imported 0 issues; skipped 3 likely duplicates' in import_file().data
+    assert b'Successfully imported 3 issues' in import_file(allow_duplicates='1').data
+    assert Issue.query.filter_by(title='Login loops').count() == 3
+    
+    # The batch pass finds copies stored without the index and archives all but the oldest
+    db.session.add(Issue(title='Slow search', description='Searching by owner takes several seconds', reporter='Dan'))
+    db.session.commit()
+    result = backend_client.application.test_cli_runner().invoke(args=['dedup', '--archive'])
+    assert result.exit_code == 0
+    assert '4 likely duplicates archived.' in result.output
+    open_titles = sorted(title for title, in db.session.execute(
+        db.select(Issue.title).where(Issue.archived == False)))
+    assert open_titles == ['Export times out', 'Login loops', 'Printer jams', 'Scanner offline', 'Slow search']
+    assert all(bucket_count(issue.id) > 0 for issue in Issue.query.all())
+
+def test_asgi_mode_streams_exports_and_changes_on_the_event_loop(tmp_path):
+    """Test the ASGI server's async export and change feed, with other routes served by Flask"""
+    pytest.importorskip('starlette')
+    pytest.importorskip('a2wsgi')
+    pytest.importorskip('aiosqlite')
+    import asyncio
+    from datetime import datetime
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from starlette.testclient import TestClient
+    from asgi import create_asgi_app, ChangeFeed
+    from backends import async_database_url
+    
+    config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "asgi.sqlite3"}', 'CHANGE_FEED_SECONDS': 0.05}
+    flask_app = create_app(config)
+    with flask_app.app_context():
+        db.create_all()
+    
+    with TestClient(create_asgi_app(config)) as client:
+        assert client.get('/export.csv', follow_redirects=False).headers['location'] == '/login'
+        assert client.get('/changes', follow_redirects=False).headers['location'] == '/login'
+        assert client.post('/login', data={'password': 'admin123'}, follow_redirects=False).status_code == 302
+        
+        # Writes go through the unchanged Flask routes
+        for title, owner in [('Async one', 'Ann'), ('Async two', 'Bob')]:
+            response = client.post('/issues', json={'title': title, 'reporter': 'R', 'owner': owner,
+                                                    'date_reported': '2025-01-02', 'target_date': '2025-02-01'})
+            assert response.status_code == 200
+        
+        response = client.get('/export.csv?owner=Bob')
+        assert response.headers['content-type'].startswith('text/csv')
+        assert response.text.splitlines() == [
+            'Title,Description,Organisation,Status,Date Reported,Reported By,Owner,Importance,Target Date',
+            'Async two,,,Open,2025-01-02,R,Bob,Medium,2025-02-01'
+        ]
+        with flask_app.test_client() as flask_client:
+            assert logged_in(flask_client).get('/export.csv').data.decode() == client.get('/export.csv').text
+        
+        issue_id = client.post('/issues', json={'title': 'Fed', 'reporter': 'R'}).json()['id']
+    
+    # The test client buffers whole responses, so the feed's poller is driven directly
+    async def next_change():
+        engine = create_async_engine(async_database_url(config['SQLALCHEMY_DATABASE_URI']))
+        feed = ChangeFeed(engine, 0.05, flask_app.logger)
+        try:
+            with feed.subscribe() as queue:
+                with flask_app.app_context():
+                    db.session.execute(db.update(Issue).where(Issue.id == issue_id)
+                                       .values(archived=True, version=Issue.version + 1, updated_at=datetime.utcnow()))
+                    db.session.commit()
+                return await asyncio.wait_for(queue.get(), 5)
+        finally:
+            await feed.stop()
+            await engine.dispose()
+    
+    assert {'id': issue_id, 'version': 2, 'archived': True} in asyncio.run(next_change())
+
+def test_asgi_mode_reads_the_instance_database_for_a_relative_sqlite_uri(tmp_path, monkeypatch):
+    """Test the ASGI export reads the same relative SQLite file Flask-SQLAlchemy writes to"""
+    pytest.importorskip('starlette')
+    pytest.importorskip('a2wsgi')
+    pytest.importorskip('aiosqlite')
+    from flask import Flask
+    from starlette.testclient import TestClient
+    from asgi import create_asgi_app
+    
+    # The default URI, resolved against a throwaway instance folder rather than the working directory
+    monkeypatch.setattr(Flask, 'auto_find_instance_path', lambda self: str(tmp_path / 'instance'))
+    monkeypatch.chdir(tmp_path)
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///db.sqlite3'}
+    flask_app = create_app(config)
+    with flask_app.app_context():
+        db.create_all()
+    
+    with TestClient(create_asgi_app(config)) as client:
+        client.post('/login', data={'password': 'admin123'})
+        assert client.post('/issues', json={'title': 'In the instance', 'reporter': 'R'}).status_code == 200
+        assert 'In the instance' in client.get('/export.csv').text
+    assert os.path.exists(tmp_path / 'instance' / 'db.sqlite3')
+    assert not os.path.exists(tmp_path / 'db.sqlite3')
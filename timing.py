@@ -0,0 +1,64 @@
+"""
+Server-Timing instrumentation, enabled with SERVER_TIMING=1.
+
+Every response gets a ``Server-Timing: db;dur=..., commit;dur=...`` header:
+the milliseconds spent executing SQL on the primary, and inside session
+commits. On SQLite, commits (which flush pending changes) include any wait
+for the database's single write lock, so loadtest.py reports the commit
+figure as lock-wait time. Off by default.
+"""
+import time
+from flask import g, has_request_context
+from sqlalchemy import event
+from models import db
+from routing import RoutingSession
+
+def init_server_timing(app):
+    if not app.config.get('SERVER_TIMING'):
+        return
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _start_statement)
+    event.listen(engine, 'after_cursor_execute', _end_statement)
+    event.listen(engine, 'handle_error', _failed_statement)
+
+    @app.before_request
+    def start_timing():
+        g.server_timing = {'db': 0.0, 'commit': 0.0}
+
+    @app.after_request
+    def add_server_timing(response):
+        timings = g.pop('server_timing', None)
+        if timings is not None:
+            response.headers['Server-Timing'] = ', '.join(
+                f'{name};dur={duration:.2f}' for name, duration in timings.items())
+        return response
+
+def record(name, started):
+    """Add the time since ``started`` (a perf_counter value) to this request's ``name`` timing"""
+    if has_request_context() and 'server_timing' in g:
+        g.server_timing[name] += (time.perf_counter() - started) * 1000
+
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    record('db', conn.info['statement_started'].pop())
+
+def _failed_statement(exception_context):
+    # after_cursor_execute doesn't fire for a statement that raised
+    if exception_context.cursor is not None and exception_context.connection is not None:
+        started = exception_context.connection.info.get('statement_started')
+        if started:
+            started.pop()
+
+@event.listens_for(RoutingSession, 'before_commit')
+def _start_commit(db_session):
+    db_session.info['commit_started'] = time.perf_counter()
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _end_commit(db_session):
+    started = db_session.info.pop('commit_started', None)
+    if started is not None:
+        record('commit', started)
@@ -0,0 +1,119 @@
+"""
+Group commit for small, frequent writes, enabled with WRITE_COALESCING=1.
+
+Comments, issue edits and restores are each tiny, but every commit on SQLite
+is a disk sync, and concurrent writers queue up behind its single write
+lock. With coalescing on, these mutations are handed to one writer thread
+per process. It waits up to WRITE_BATCH_WINDOW_MS after the first job for
+others to arrive, runs each job in its own savepoint, and commits the whole
+batch at once. A job that fails only rolls back its own savepoint, and every
+caller gets its own result or exception back, as if it had committed alone.
+
+Jobs run outside the request on the writer's own session, so they take and
+return plain values (ids, dicts), never ORM instances.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from flask import current_app
+from models import db
+from backends import begin_write
+from routing import remember_write
+from timing import record
+
+def init_write_queue(app):
+    if app.config.get('WRITE_COALESCING'):
+        app.extensions['write_queue'] = WriteQueue(
+            app, app.config['WRITE_BATCH_WINDOW_MS'] / 1000, app.config['WRITE_BATCH_SIZE'])
+
+def run_write(job, *args):
+    """Run ``job(*args)`` and commit it, returning the job's result.
+
+    Without coalescing this is just the job plus ``db.session.commit()``.
+    With it, the job is committed by the writer thread as part of a batch.
+    """
+    write_queue = current_app.extensions.get('write_queue')
+    if write_queue is None:
+        try:
+            result = job(*args)
+        except Exception:
+            db.session.rollback()
+            raise
+        db.session.commit()
+        return result
+
+    started = time.perf_counter()
+    result = write_queue.submit(job, *args)
+    # Waiting for the batch is this request's commit time
+    record('commit', started)
+    remember_write()
+    return result
+
+class WriteQueue:
+    def __init__(self, app, window, batch_size):
+        self.app = app
+        self.window = window
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._jobs = None
+        self._writer = None
+        self._pid = None
+
+    def submit(self, job, *args):
+        """Queue ``job(*args)`` and block until its batch has committed"""
+        future = Future()
+        with self._lock:
+            # Threads don't survive a fork (gunicorn --preload), so each worker
+            # process starts its own writer on first use
+            if self._pid != os.getpid() or not self._writer.is_alive():
+                self._jobs = queue.SimpleQueue()
+                self._writer = threading.Thread(target=self._run, args=(self._jobs,),
+                                                name='write-queue', daemon=True)
+                self._pid = os.getpid()
+                self._writer.start()
+            self._jobs.put((job, args, future))
+        return future.result()
+
+    def _run(self, jobs):
+        while True:
+            batch = [jobs.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(jobs.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        outcomes = []
+        try:
+            with self.app.app_context():
+                try:
+                    begin_write(db.session)
+                    for job, args, future in batch:
+                        try:
+                            with db.session.begin_nested():
+                                outcomes.append((future, job(*args), None))
+                        except Exception as e:
+                            outcomes.append((future, None, e))
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+        except Exception as e:
+            # Nothing in the batch was committed
+            for job, args, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)